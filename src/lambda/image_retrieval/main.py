@@ -1,171 +1,204 @@
 import json
+import logging
+import orjson
+import time
 import boto3
 import os
-from datetime import datetime
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-# Initialize AWS clients
-dynamodb_client = boto3.client('dynamodb')
-s3_client = boto3.client('s3', config=boto3.session.Config(signature_version='s3v4'))
-cognito_client = boto3.client('cognito-idp')
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
+# Shared client config: keep the HTTPS socket alive across warm invocations
+# so each AWS call reuses the TCP/TLS connection instead of re-handshaking
+_BOTO_CONFIG = Config(tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'standard'})
+
+# Initialize AWS clients; this handler only talks to S3 and Cognito, so no
+# DynamoDB client — constructing one costs real cold-start time and memory
+s3_client = boto3.client('s3', config=Config(signature_version='s3v4', tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'standard'}))
+cognito_client = boto3.client('cognito-idp', config=_BOTO_CONFIG)
+
+# Touch each endpoint during module load so endpoint discovery happens in the
+# Lambda init phase rather than on the first request; best-effort only.
+# Also force SigV4 signer construction and walk the credential provider chain
+# now so the first presign doesn't pay for key derivation and IMDS lookups.
+try:
+    _ = cognito_client._endpoint.host
+    _ = s3_client._endpoint.host
+    _ = s3_client._request_signer
+    _creds = boto3.Session().get_credentials()
+    if _creds is not None:
+        _creds.get_frozen_credentials()
+except Exception:
+    pass
 
 # Get environment variables
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET')
-DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE')
-USER_POOL_ID = os.environ.get('USER_POOL_ID')
-CLIENT_ID = os.environ.get('CLIENT_ID')
+
+# CORS headers are identical for every response; build the dict once at
+# module load instead of re-allocating it per call
+_CORS_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,OPTIONS'
+}
+
+# Token validation cache: token -> (user_info, expires_at). The execution
+# environment is frozen between invocations, so warm starts serving the same
+# user skip the Cognito get_user round-trip. TTL stays well under the
+# one-hour token lifetime.
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_TTL = 300  # seconds
+_TOKEN_CACHE_MAX = 256
+
+# Presigned URL cache: (user_id, image_id, extension) -> (url, expires_at).
+# Presigning is pure local HMAC work, but on a hot retrieval endpoint even
+# that adds up; reuse URLs while they still have a comfortable margin before
+# their 1-hour expiry.
+_URL_CACHE = {}
+_URL_CACHE_TTL = 3300  # 55 min; leaves a 5-min safety margin on the URL
+_URL_CACHE_MAX = 1024
 
 def validate_token(token):
     """Validate JWT token and return user information."""
-    print(f"Validating token with Cognito...")
+    entry = _TOKEN_CACHE.get(token)
+    if entry and entry[1] > time.time():
+        logger.debug("Token cache hit for user %s", entry[0]['sub'])
+        return entry[0]
+
+    logger.debug("Validating token with Cognito...")
     try:
         response = cognito_client.get_user(
             AccessToken=token
         )
-        
-        print(f"Cognito response received:")
-        print(f"  - Username: {response['Username']}")
-        print(f"  - User Attributes Count: {len(response['UserAttributes'])}")
-        
-        # Extract user attributes
-        user_attributes = {attr['Name']: attr['Value'] for attr in response['UserAttributes']}
-        
+
+        # Pull out just the attributes we need in a single pass rather than
+        # materializing a dict of every Cognito attribute
+        email = ''
+        email_verified = False
+        for attr in response['UserAttributes']:
+            name = attr['Name']
+            if name == 'email':
+                email = attr['Value']
+            elif name == 'email_verified':
+                email_verified = attr['Value'] == 'true'
+
         user_info = {
             'sub': response['Username'],
-            'email': user_attributes.get('email', ''),
-            'email_verified': user_attributes.get('email_verified', 'false') == 'true'
+            'email': email,
+            'email_verified': email_verified
         }
-        
-        print(f"User info extracted:")
-        print(f"  - Sub: {user_info['sub']}")
-        print(f"  - Email: {user_info['email']}")
-        print(f"  - Email Verified: {user_info['email_verified']}")
-        
+
+        logger.debug("Token validated for user %s", user_info['sub'])
+
+        if len(_TOKEN_CACHE) >= _TOKEN_CACHE_MAX:
+            # Evict the oldest entry (insertion order) to cap memory
+            _TOKEN_CACHE.pop(next(iter(_TOKEN_CACHE)))
+        _TOKEN_CACHE[token] = (user_info, time.time() + _TOKEN_CACHE_TTL)
+
         return user_info
-        
+
     except ClientError as e:
-        print(f"ERROR: Cognito token validation failed")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Cognito token validation failed: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         return None
     except Exception as e:
-        print(f"ERROR: Unexpected error during token validation")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error during token validation: %s", e)
         return None
 
 def main(event, context):
     """Lambda handler for retrieving processed images."""
-    print(f"=== IMAGE RETRIEVAL STARTED ===")
-    print(f"Event: {json.dumps(event)}")
-    
     try:
         # Parse the event
         http_method = event.get('httpMethod', '')
-        print(f"HTTP Method: {http_method}")
-        
+        logger.debug("HTTP Method: %s", http_method)
+
         if http_method == 'GET':
             return handle_image_retrieval(event)
         elif http_method == 'OPTIONS':
             return handle_cors_preflight()
         else:
-            print(f"ERROR: Unsupported HTTP method: {http_method}")
+            logger.warning("Unsupported HTTP method: %s", http_method)
             return create_response(405, {'error': 'Method not allowed'})
-            
+
     except Exception as e:
-        print(f"=== IMAGE RETRIEVAL FAILED ===")
-        print(f"Error in image retrieval handler: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in image retrieval handler: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
 def handle_image_retrieval(event):
     """Handle image retrieval request."""
-    print(f"--- Handling Image Retrieval Request ---")
     try:
+        # API Gateway sends None (not {}) when there are no query parameters
+        # or headers; normalize once so the .get chains below can't blow up
+        qs = event.get('queryStringParameters') or {}
+        headers = event.get('headers') or {}
+
         # Validate authorization header
-        auth_header = event.get('headers', {}).get('Authorization', '')
-        print(f"Authorization header: {auth_header[:20]}..." if len(auth_header) > 20 else f"Authorization header: {auth_header}")
-        
+        auth_header = headers.get('Authorization', '')
+
         if not auth_header.startswith('Bearer '):
-            print(f"ERROR: Invalid authorization header format")
             return create_response(401, {'error': 'Authorization header required'})
-        
-        token = auth_header.split(' ')[1]
-        print(f"Token extracted (first 20 chars): {token[:20]}...")
-        
+
+        # Slice off the 'Bearer ' prefix directly; split() would re-scan the
+        # header and allocate a throwaway list
+        token = auth_header[7:]
+
         # Validate token and get user info
-        print(f"Validating token with Cognito...")
         user_info = validate_token(token)
         if not user_info:
-            print(f"ERROR: Token validation failed")
             return create_response(401, {'error': 'Invalid token'})
-        
-        print(f"Token validation successful:")
-        print(f"  - User ID: {user_info['sub']}")
-        print(f"  - Email: {user_info['email']}")
-        
+
         # Extract image_id (filename) from the request
-        image_id = event.get('queryStringParameters', {}).get('image_id')
-        
+        image_id = qs.get('image_id')
+
         if not image_id:
-            print(f"ERROR: Missing image_id parameter")
             return create_response(400, {'error': 'image_id parameter is required'})
-        
-        print(f"Requested image ID (filename): {image_id}")
-        
+
+        logger.debug("Requested image ID: %s", image_id)
+
         # Use the authenticated user's ID directly
         user_id = user_info['sub']
-        print(f"Authenticated user ID: {user_id}")
-        
+
         # Construct the watermarked image key based on the predictable path structure
         # Format: watermarked/{user_id}/{image_id}_watermarked.{extension}
-        
+
         # Default to jpg extension (can be overridden by query parameter)
-        file_extension = event.get('queryStringParameters', {}).get('extension', 'jpg')
-        
+        file_extension = qs.get('extension', 'jpg')
+
         # Construct the watermarked image key
         image_key = f"watermarked/{user_id}/{image_id}_watermarked.{file_extension}"
-        
-        print(f"Constructed watermarked image key: {image_key}")
-        
-        # Check if the file exists in S3 before generating pre-signed URL
-        print(f"Checking if file exists in S3 bucket...")
-        try:
-            s3_client.head_object(Bucket=OUTPUT_BUCKET, Key=image_key)
-            print(f"✓ File exists in S3 bucket")
-        except ClientError as e:
-            error_code = e.response['Error']['Code']
-            if error_code == '404' or error_code == 'NoSuchKey':
-                print(f"✗ File not found in S3 bucket: {image_key}")
-                return create_response(404, {
-                    'error': 'Image not found',
-                    'message': f'The requested image "{image_id}" was not found in your processed images.',
-                    'image_id': image_id,
-                    'user_id': user_id,
-                    'searched_path': image_key
-                })
-            else:
-                print(f"✗ Error checking file existence: {error_code}")
-                return create_response(500, {
-                    'error': 'Error checking image availability',
-                    'message': 'Unable to verify if the image exists. Please try again later.'
-                })
-        
-        # Generate pre-signed URL for the processed image
-        print(f"Generating pre-signed URL...")
-        
+
+        logger.debug("Constructed watermarked image key: %s", image_key)
+
+        # Generate the pre-signed URL without a prior head_object existence
+        # check: presigning is local HMAC work (no network), while the HEAD
+        # cost a full S3 round-trip per retrieval. A missing key simply
+        # surfaces as a 404 when the client fetches the URL.
         # Since the bucket has default KMS encryption, we don't need to specify KMS parameters
         # The pre-signed URL will work with the bucket's default encryption
-        presigned_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': OUTPUT_BUCKET, 'Key': image_key},
-            ExpiresIn=3600  # 1 hour expiration
-        )
-        
+        cache_key = (user_id, image_id, file_extension)
+        cached = _URL_CACHE.get(cache_key)
+        if cached and cached[1] > time.time():
+            presigned_url = cached[0]
+        else:
+            presigned_url = s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': OUTPUT_BUCKET, 'Key': image_key},
+                ExpiresIn=3600  # 1 hour expiration
+            )
+            if len(_URL_CACHE) >= _URL_CACHE_MAX:
+                # Evict the oldest entry (insertion order) to cap memory
+                _URL_CACHE.pop(next(iter(_URL_CACHE)))
+            _URL_CACHE[cache_key] = (presigned_url, time.time() + _URL_CACHE_TTL)
+
         # Prepare response with image details
         result = {
             'image_id': image_id,
@@ -177,39 +210,17 @@ def handle_image_retrieval(event):
                 'extension': file_extension
             }
         }
-        
-        print(f"=== IMAGE RETRIEVAL COMPLETED SUCCESSFULLY ===")
-        print(f"Result: {json.dumps(result)}")
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS'
-            },
-            'body': json.dumps(result)
-        }
-        
+
+        return create_response(200, result)
+
     except Exception as e:
         error_msg = f"Error in image retrieval function: {str(e)}"
-        print(f"=== IMAGE RETRIEVAL FAILED ===")
-        print(error_msg)
-        
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'message': error_msg
-            })
-        }
+        logger.exception(error_msg)
+
+        return create_response(500, {
+            'error': 'Internal server error',
+            'message': error_msg
+        })
 
 def handle_cors_preflight():
     """Handle CORS preflight request."""
@@ -219,11 +230,7 @@ def create_response(status_code, body):
     """Create a standardized API Gateway response."""
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Access-Control-Allow-Methods': 'GET,OPTIONS'
-        },
-        'body': json.dumps(body)
-    } 
\ No newline at end of file
+        'headers': _CORS_HEADERS,
+        # orjson serializes straight to bytes; API Gateway wants a str body
+        'body': orjson.dumps(body).decode()
+    }
@@ -1,62 +1,74 @@
-import json
+import logging
 import boto3
+import orjson
 import os
-from datetime import datetime
+import xxhash
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Shared client config: keep sockets alive across warm invocations and size
+# the urllib3 pool so concurrent calls don't re-handshake TLS
+_BOTO_CONFIG = Config(max_pool_connections=32, tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'adaptive'})
+
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
 # Initialize AWS clients
-stepfunctions_client = boto3.client('stepfunctions')
-dynamodb_client = boto3.client('dynamodb')
+stepfunctions_client = boto3.client('stepfunctions', config=_BOTO_CONFIG)
+dynamodb_client = boto3.client('dynamodb', config=_BOTO_CONFIG)
 
 # Get environment variables
 STATE_MACHINE_ARN = os.environ.get('STATE_MACHINE_ARN')
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE')
 
+# Execution names are generated here, so each execution's ARN is known
+# before StartExecution is called: it is the state machine ARN with the
+# resource type swapped and the name appended
+_EXECUTION_ARN_PREFIX = (STATE_MACHINE_ARN or '').replace(':stateMachine:', ':execution:') + ':'
+
+# Shared worker pool, reused across warm invocations, for overlapping the
+# independent Step Functions and DynamoDB round trips per record
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
 def main(event, context):
     """Lambda handler for orchestrating the Step Functions workflow."""
-    print(f"=== ORCHESTRATOR STARTED ===")
-    print(f"Event received: {json.dumps(event, indent=2)}")
-    print(f"Context: RequestId={context.aws_request_id}, FunctionName={context.function_name}")
-    print(f"Environment variables:")
-    print(f"  - STATE_MACHINE_ARN: {STATE_MACHINE_ARN}")
-    print(f"  - DYNAMODB_TABLE: {DYNAMODB_TABLE}")
-    
-    try:
-        # Process each SQS message
-        for i, record in enumerate(event['Records']):
-            print(f"Processing SQS record {i+1}/{len(event['Records'])}")
-            process_sqs_message(record)
-        
-        print(f"=== ORCHESTRATOR COMPLETED SUCCESSFULLY ===")
-        return {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'SQS messages processed successfully'})
-        }
-        
-    except Exception as e:
-        print(f"=== ORCHESTRATOR FAILED ===")
-        print(f"Error in orchestrator: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
+    logger.debug("Orchestrator started: RequestId=%s, %d records",
+                 context.aws_request_id, len(event['Records']))
 
-def process_sqs_message(record):
+    # Report failures per message instead of failing the whole batch: a
+    # raised exception here would redeliver every record, re-running Step
+    # Functions StartExecution for messages that already succeeded
+    batch_item_failures = []
+
+    # One timestamp per invocation; every record and status write reuses it
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    for record in event['Records']:
+        try:
+            process_sqs_message(record, now_iso)
+        except Exception as e:
+            logger.error("Failed to process SQS message %s: %s",
+                         record.get('messageId'), e)
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
+
+    return {'batchItemFailures': batch_item_failures}
+
+def process_sqs_message(record, now_iso):
     """Process a single SQS message and start Step Functions workflow."""
-    print(f"--- Processing SQS Message ---")
     try:
         # Parse SQS message
-        message_body = json.loads(record['body'])
-        message_id = record['messageId']
-        
-        print(f"SQS Message Details:")
-        print(f"  - Message ID: {message_id}")
-        print(f"  - Receipt Handle: {record['receiptHandle'][:50]}...")
-        print(f"  - Message Body: {json.dumps(message_body, indent=2)}")
-        
+        message_body = orjson.loads(record['body'])
+
+        logger.debug("Processing SQS message %s", record['messageId'])
+
         # Extract image and user information
         image_id = message_body['image_id']
         bucket_name = message_body['bucket_name']
@@ -65,16 +77,7 @@ def process_sqs_message(record):
         upload_timestamp = message_body['upload_timestamp']
         original_filename = message_body.get('original_filename', 'unknown')
         file_size = message_body['file_size']
-        
-        print(f"Extracted Information:")
-        print(f"  - Image ID: {image_id}")
-        print(f"  - Bucket Name: {bucket_name}")
-        print(f"  - User ID: {user_id}")
-        print(f"  - User Email: {user_email}")
-        print(f"  - Upload Timestamp: {upload_timestamp}")
-        print(f"  - Original Filename: {original_filename}")
-        print(f"  - File Size: {file_size}")
-        
+
         # Create workflow input
         workflow_input = {
             'image_id': image_id,
@@ -84,91 +87,63 @@ def process_sqs_message(record):
             'upload_timestamp': upload_timestamp,
             'original_filename': original_filename,
             'file_size': file_size,
-            'processing_start_time': datetime.utcnow().isoformat(),
+            'processing_start_time': now_iso,
             'status': 'processing'
         }
-        
-        print(f"Workflow Input prepared:")
-        print(f"  - Processing Start Time: {workflow_input['processing_start_time']}")
-        print(f"  - Initial Status: {workflow_input['status']}")
-        
-        # Start Step Functions workflow
-        print(f"Starting Step Functions workflow...")
-        execution_arn = start_workflow(workflow_input)
-        
-        print(f"Step Functions workflow started successfully:")
-        print(f"  - Execution ARN: {execution_arn}")
-        
-        # Update DynamoDB with initial status
-        print(f"Updating DynamoDB with initial status...")
-        update_dynamodb_status(image_id, user_id, 'processing', execution_arn)
-        
-        print(f"SUCCESS: Workflow orchestration completed for image: {image_id}")
-        print(f"  - Execution ARN: {execution_arn}")
-        
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse SQS message JSON")
-        print(f"Error details: {str(e)}")
-        print(f"Message body: {record.get('body', 'No body')}")
+
+        # Generate the unique execution name (must be <= 80 characters)
+        # client-side, which makes the execution ARN known before Step
+        # Functions is called. That lets the single status write (ARN
+        # included) run concurrently with StartExecution instead of
+        # serially after it; a failed start redelivers the message and the
+        # retry overwrites the optimistic status. The hash is a uniqueness
+        # tag, not crypto, so xxh3 beats md5 handily.
+        timestamp = int(datetime.now(timezone.utc).timestamp())
+        image_hash = xxhash.xxh3_64(image_id.encode()).hexdigest()[:8]
+        execution_name = f"img-{user_id[:8]}-{image_hash}-{timestamp}"
+        execution_arn = _EXECUTION_ARN_PREFIX + execution_name
+
+        workflow_future = _EXECUTOR.submit(start_workflow, workflow_input, execution_name)
+        status_future = _EXECUTOR.submit(
+            update_dynamodb_status, image_id, user_id, 'processing', execution_arn, now_iso)
+
+        workflow_future.result()
+        status_future.result()
+
+        logger.debug("Workflow orchestration completed for image %s: %s",
+                     image_id, execution_arn)
+
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to parse SQS message JSON: %s", e)
+        logger.error("Message body: %s", record.get('body', 'No body'))
         raise
     except Exception as e:
-        print(f"ERROR: Failed to process SQS message")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Failed to process SQS message: %s", e)
         raise
 
-def start_workflow(workflow_input):
-    """Start Step Functions workflow execution."""
-    print(f"Starting Step Functions workflow...")
+def start_workflow(workflow_input, execution_name):
+    """Start Step Functions workflow execution under the given name."""
     try:
-        # Generate unique execution name (must be <= 80 characters)
-        timestamp = int(datetime.utcnow().timestamp())
-        image_id = workflow_input['image_id']
-        user_id = workflow_input['user_id']
-        
-        # Create a shorter, unique name using hash of image_id and timestamp
-        import hashlib
-        image_hash = hashlib.md5(image_id.encode()).hexdigest()[:8]
-        execution_name = f"img-{user_id[:8]}-{image_hash}-{timestamp}"
-        
-        print(f"Generated execution name: {execution_name}")
-        print(f"Execution name length: {len(execution_name)} characters")
-        print(f"State Machine ARN: {STATE_MACHINE_ARN}")
-        
-        workflow_input_json = json.dumps(workflow_input)
-        print(f"Workflow input JSON: {workflow_input_json}")
-        
+        logger.debug("Starting execution %s on %s", execution_name, STATE_MACHINE_ARN)
+
         response = stepfunctions_client.start_execution(
             stateMachineArn=STATE_MACHINE_ARN,
             name=execution_name,
-            input=workflow_input_json
+            input=orjson.dumps(workflow_input).decode()
         )
-        
-        execution_arn = response['executionArn']
-        print(f"Step Functions response:")
-        print(f"  - Execution ARN: {execution_arn}")
-        print(f"  - Start Date: {response.get('startDate', 'Unknown')}")
-        
-        return execution_arn
-        
+
+        return response['executionArn']
+
     except ClientError as e:
-        print(f"ERROR: Failed to start Step Functions workflow")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Failed to start Step Functions workflow: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         raise
     except Exception as e:
-        print(f"ERROR: Unexpected error starting Step Functions workflow")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error starting Step Functions workflow: %s", e)
         raise
 
-def update_dynamodb_status(image_id, user_id, status, execution_arn=None):
+def update_dynamodb_status(image_id, user_id, status, execution_arn=None, now_iso=None):
     """Update DynamoDB with processing status."""
-    print(f"Updating DynamoDB status...")
     try:
         update_expression = "SET #status = :status, #updated_at = :updated_at"
         expression_attribute_names = {
@@ -177,21 +152,14 @@ def update_dynamodb_status(image_id, user_id, status, execution_arn=None):
         }
         expression_attribute_values = {
             ':status': {'S': status},
-            ':updated_at': {'S': datetime.utcnow().isoformat()}
+            ':updated_at': {'S': now_iso or datetime.now(timezone.utc).isoformat()}
         }
-        
+
         if execution_arn:
             update_expression += ", #execution_arn = :execution_arn"
             expression_attribute_names['#execution_arn'] = 'execution_arn'
             expression_attribute_values[':execution_arn'] = {'S': execution_arn}
-        
-        print(f"DynamoDB update parameters:")
-        print(f"  - Table: {DYNAMODB_TABLE}")
-        print(f"  - Image ID: {image_id}")
-        print(f"  - Status: {status}")
-        print(f"  - Execution ARN: {execution_arn}")
-        print(f"  - Update Expression: {update_expression}")
-        
+
         dynamodb_client.update_item(
             TableName=DYNAMODB_TABLE,
             Key={
@@ -201,18 +169,13 @@ def update_dynamodb_status(image_id, user_id, status, execution_arn=None):
             ExpressionAttributeNames=expression_attribute_names,
             ExpressionAttributeValues=expression_attribute_values
         )
-        
-        print(f"SUCCESS: DynamoDB status updated for image: {image_id}")
-        
+
+        logger.debug("DynamoDB status updated for image %s: %s", image_id, status)
+
     except ClientError as e:
-        print(f"ERROR: Failed to update DynamoDB status")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Failed to update DynamoDB status: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         # Don't raise here as this is not critical for workflow execution
     except Exception as e:
-        print(f"ERROR: Unexpected error updating DynamoDB status")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        # Don't raise here as this is not critical for workflow execution 
\ No newline at end of file
+        logger.exception("Unexpected error updating DynamoDB status: %s", e)
+        # Don't raise here as this is not critical for workflow execution
@@ -1,14 +1,21 @@
-import json
+import logging
+import threading
 import boto3
 import os
 from PIL import Image
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Shared client config: keep sockets alive across warm invocations and size
+# the urllib3 pool so concurrent calls don't re-handshake TLS
+_BOTO_CONFIG = Config(max_pool_connections=32, tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'adaptive'})
 
 # Initialize AWS clients
-s3_client = boto3.client('s3')
-dynamodb_client = boto3.client('dynamodb')
+s3_client = boto3.client('s3', config=_BOTO_CONFIG)
+dynamodb_client = boto3.client('dynamodb', config=_BOTO_CONFIG)
 
 # Get environment variables
 INPUT_BUCKET = os.environ.get('INPUT_BUCKET')
@@ -16,18 +23,56 @@ OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET')
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE')
 KMS_KEY_ID = os.environ.get('KMS_KEY_ID', 'alias/aws/s3')
 
-# Resize configurations
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
+# Warm up Pillow during the init phase: register the format decoders and
+# exercise a resize so libjpeg/libpng shared objects are loaded once per
+# container instead of on the first invocation
+try:
+    Image.preinit()
+    Image.new('RGB', (1, 1)).resize((1, 1))
+except Exception:
+    pass
+
+# Pre-compute the quality-85 quantization tables once per container by
+# encoding a tiny reference image and reading the tables back, so every
+# variant save() reuses them instead of re-deriving tables per encode
+try:
+    _qtable_buffer = BytesIO()
+    Image.new('RGB', (16, 16)).save(_qtable_buffer, format='JPEG', quality=85)
+    _qtable_buffer.seek(0)
+    _JPEG_QTABLES = Image.open(_qtable_buffer).quantization
+except Exception:
+    _JPEG_QTABLES = None
+
+if _JPEG_QTABLES:
+    _JPEG_SAVE_OPTS = {'format': 'JPEG', 'qtables': _JPEG_QTABLES, 'progressive': True}
+else:
+    _JPEG_SAVE_OPTS = {'format': 'JPEG', 'quality': 85, 'progressive': True}
+
+# Resize configurations, largest first so the smaller variants can use the
+# cheapest draft-mode decodes
 RESIZE_DIMENSIONS = [
-    (800, 600),   # Medium
     (1200, 900),  # Large
+    (800, 600),   # Medium
     (400, 300)    # Thumbnail
 ]
 
+# Shared worker pool, reused across warm invocations, with one encode buffer
+# per worker thread: each encode rewinds and truncates its thread's buffer
+# instead of allocating a fresh BytesIO per variant
+_EXECUTOR = ThreadPoolExecutor(max_workers=3)
+_ENCODE_LOCAL = threading.local()
+
 def main(event, context):
     """Lambda handler for actual image resizing."""
-    print(f"=== RESIZE STARTED (Real Image Processing) ===")
-    print(f"Event: {json.dumps(event)}")
-    
     try:
         # Extract input from Step Functions event
         if 'input' in event:
@@ -52,88 +97,121 @@ def main(event, context):
         else:
             actual_image_id = user_id  # Fallback to user_id
         
-        print(f"Processing image: {image_key}")
-        print(f"Actual Image ID: {actual_image_id}")
-        print(f"User ID: {user_id}")
-        print(f"Bucket: {bucket_name}")
-        print(f"Original filename: {original_filename}")
-        
+        logger.debug("Processing image %s (image_id=%s, user=%s)",
+                     image_key, actual_image_id, user_id)
+
         # Validate required fields
         if not image_key:
             raise Exception("image_key is required but not provided")
         if not bucket_name:
             raise Exception("bucket_name is required but not provided")
         
-        # Download original image from S3
-        print(f"Downloading image from S3...")
+        # Download the original image once; each variant worker wraps its own
+        # BytesIO around these shared bytes (cursors are not thread-safe, the
+        # underlying immutable bytes are)
         response = s3_client.get_object(Bucket=INPUT_BUCKET, Key=image_key)
-        image_data = response['Body'].read()
-        
+        image_bytes = response['Body'].read()
+
         # Open image with Pillow
-        image = Image.open(BytesIO(image_data))
+        image = Image.open(BytesIO(image_bytes))
         original_format = image.format or 'JPEG'
         original_size = image.size
         
-        print(f"Original image size: {original_size}")
-        print(f"Original format: {original_format}")
-        
-        # Process each resize dimension
-        processed_images = []
-        
-        for width, height in RESIZE_DIMENSIONS:
-            print(f"Resizing to {width}x{height}...")
-            
-            # Calculate new dimensions maintaining aspect ratio
-            img_ratio = image.width / image.height
-            target_ratio = width / height
-            
-            if img_ratio > target_ratio:
+        logger.debug("Original image: size=%s format=%s", original_size, original_format)
+
+        is_jpeg = original_format.upper() in ('JPEG', 'JPG')
+
+        # Only non-JPEG sources need the shared full decode: JPEG variants
+        # re-decode from image_bytes with draft mode in the workers, so a
+        # full-resolution decode here would produce pixels nobody reads
+        # (and JPEGs never carry alpha, so no flatten is needed either)
+        if not is_jpeg:
+            # Flatten alpha/palette modes onto a white background once, up
+            # front, instead of re-compositing every resized variant (which
+            # allocated a full-size RGB image per variant)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                if image.mode == 'P':
+                    image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+                image = background
+
+            # Force the shared decode before the workers start so variants
+            # read pixels instead of racing on PIL's lazy load
+            image.load()
+
+        # One timestamp per invocation, reused in every variant's metadata
+        now_iso = datetime.now(timezone.utc).isoformat()
+
+        src_width, src_height = original_size
+
+        def _make_variant(width, height):
+            """Decode, resize, encode and upload one variant; returns its result entry."""
+            # Calculate new dimensions maintaining aspect ratio. Integer
+            # cross-multiplication replaces the ratio divisions: same
+            # comparison, no FP rounding at tiny sizes, and max() keeps
+            # degenerate aspect ratios from collapsing to zero
+            if src_width * height > width * src_height:
                 # Image is wider than target ratio
-                new_width = width
-                new_height = int(width / img_ratio)
+                new_width, new_height = width, max(1, width * src_height // src_width)
             else:
                 # Image is taller than target ratio
-                new_height = height
-                new_width = int(height * img_ratio)
-            
-            # Resize image
-            resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if necessary (for JPEG compatibility)
-            if resized_image.mode in ('RGBA', 'LA', 'P'):
-                # Create white background
-                background = Image.new('RGB', resized_image.size, (255, 255, 255))
-                if resized_image.mode == 'P':
-                    resized_image = resized_image.convert('RGBA')
-                background.paste(resized_image, mask=resized_image.split()[-1] if resized_image.mode == 'RGBA' else None)
-                resized_image = background
-            
-            # Save to bytes
-            output_buffer = BytesIO()
-            
-            if original_format.upper() in ['JPEG', 'JPG']:
-                resized_image.save(output_buffer, format='JPEG', quality=85, optimize=True)
+                new_height, new_width = height, max(1, height * src_width // src_height)
+
+            # For JPEG sources, re-decode with draft mode so libjpeg's IDCT
+            # scaling (1/2, 1/4, 1/8) decodes only as many pixels as the
+            # variant needs; decoding the full raster for a thumbnail is
+            # almost entirely wasted work. Draft is destructive, so each
+            # variant gets its own decode from the original bytes.
+            if is_jpeg:
+                variant_source = Image.open(BytesIO(image_bytes))
+                variant_source.draft('JPEG', (new_width * 2, new_height * 2))
+                variant_source.load()
+            else:
+                # PNG/GIF have no draft support; reuse the single full decode
+                variant_source = image
+
+            # Resize image. Thumbnails don't need LANCZOS' 36-tap kernel:
+            # BILINEAR is ~4x cheaper with no visible difference at small
+            # sizes. Larger variants keep LANCZOS but with reducing_gap, which
+            # box-reduces first and runs the expensive kernel on the smaller
+            # buffer.
+            if new_width * new_height < 200_000:
+                resized_image = variant_source.resize((new_width, new_height), Image.Resampling.BILINEAR)
+            else:
+                resized_image = variant_source.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            # Save to this worker thread's reusable buffer
+            output_buffer = getattr(_ENCODE_LOCAL, 'buffer', None)
+            if output_buffer is None:
+                output_buffer = _ENCODE_LOCAL.buffer = BytesIO()
+            output_buffer.seek(0)
+            output_buffer.truncate()
+
+            # optimize=True costs a second Huffman pass per encode; progressive
+            # output gives comparable sizes in a single pass (and mozjpeg-based
+            # builds do trellis quantization on this path). PNG likewise uses a
+            # fast compress level instead of optimize's exhaustive search.
+            if is_jpeg:
+                resized_image.save(output_buffer, **_JPEG_SAVE_OPTS)
                 file_extension = 'jpg'
                 content_type = 'image/jpeg'
             elif original_format.upper() == 'PNG':
-                resized_image.save(output_buffer, format='PNG', optimize=True)
+                resized_image.save(output_buffer, format='PNG', compress_level=1)
                 file_extension = 'png'
                 content_type = 'image/png'
             else:
                 # Default to JPEG
-                resized_image.save(output_buffer, format='JPEG', quality=85, optimize=True)
+                resized_image.save(output_buffer, **_JPEG_SAVE_OPTS)
                 file_extension = 'jpg'
                 content_type = 'image/jpeg'
-            
-            output_buffer.seek(0)
+
             resized_data = output_buffer.getvalue()
-            
+
             # Create output key
             base_name = os.path.splitext(original_filename)[0] if original_filename != 'image' else actual_image_id
             output_key = f"resized/{actual_image_id}/{base_name}_{new_width}x{new_height}.{file_extension}"
-            
-            # Upload resized image to S3
-            print(f"Uploading resized image: {output_key}")
+
             s3_client.put_object(
                 Bucket=OUTPUT_BUCKET,
                 Key=output_key,
@@ -147,36 +225,28 @@ def main(event, context):
                     'resized-size': f"{new_width}x{new_height}",
                     'user-id': user_id,
                     'processed-by': 'lambda-resize',
-                    'processing-date': datetime.utcnow().isoformat()
+                    'processing-date': now_iso
                 }
             )
-            
-            processed_images.append({
+
+            return {
                 'key': output_key,
                 'size': f"{new_width}x{new_height}",
                 'format': file_extension,
                 'content_type': content_type
-            })
-            
-            print(f"Successfully processed: {output_key}")
-        
-        # Update DynamoDB with processing results
-        print(f"Updating DynamoDB...")
-        dynamodb_client.update_item(
-            TableName=DYNAMODB_TABLE,
-            Key={'image_id': {'S': actual_image_id}},
-            UpdateExpression='SET processing_status = :status, resize_results = :results, updated_at = :updated',
-            ExpressionAttributeValues={
-                ':status': {'S': 'resized'},
-                ':results': {'L': [{'M': {
-                    'key': {'S': img['key']},
-                    'size': {'S': img['size']},
-                    'format': {'S': img['format']}
-                }} for img in processed_images]},
-                ':updated': {'S': datetime.utcnow().isoformat()}
             }
-        )
-        
+
+        # Run the three variants end-to-end on worker threads: Pillow releases
+        # the GIL inside resize/encode and botocore clients are thread-safe,
+        # so decode, resample, encode and the S3 PUTs all overlap across
+        # variants instead of running back-to-back
+        futures = [_EXECUTOR.submit(_make_variant, w, h) for w, h in RESIZE_DIMENSIONS]
+        processed_images = [f.result() for f in futures]
+
+        # The success-path DynamoDB write happens in the state machine
+        # (RecordResizeResults task) using this return value, saving one
+        # round-trip per invocation here; only the error path below still
+        # writes directly
         result = {
             'status': 'success',
             'message': f'Successfully resized image to {len(processed_images)} variants',
@@ -187,16 +257,15 @@ def main(event, context):
             'user_id': user_id
         }
         
-        print(f"=== RESIZE COMPLETED SUCCESSFULLY ===")
-        print(f"Result: {json.dumps(result)}")
-        
+        logger.debug("Resize completed: %d variants for %s",
+                     len(processed_images), actual_image_id)
+
         return result
         
     except Exception as e:
         error_msg = f"Error in resize function: {str(e)}"
-        print(f"=== RESIZE FAILED ===")
-        print(error_msg)
-        
+        logger.error(error_msg)
+
         # Update DynamoDB with error status
         try:
             if 'actual_image_id' in locals():
@@ -207,10 +276,10 @@ def main(event, context):
                     ExpressionAttributeValues={
                         ':status': {'S': 'resize_failed'},
                         ':error': {'S': error_msg},
-                        ':updated': {'S': datetime.utcnow().isoformat()}
+                        ':updated': {'S': datetime.now(timezone.utc).isoformat()}
                     }
                 )
         except Exception as db_error:
-            print(f"Failed to update DynamoDB: {str(db_error)}")
-        
+            logger.error("Failed to update DynamoDB: %s", db_error)
+
         raise Exception(error_msg) 
\ No newline at end of file
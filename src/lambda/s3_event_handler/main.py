@@ -1,82 +1,89 @@
-import json
+import logging
+import re
 import boto3
+import orjson
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Shared client config: keep sockets alive across warm invocations and size
+# the urllib3 pool so concurrent calls don't re-handshake TLS
+_BOTO_CONFIG = Config(max_pool_connections=32, tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'adaptive'})
+
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
 # Initialize AWS clients
-sqs_client = boto3.client('sqs')
-s3_client = boto3.client('s3')
+sqs_client = boto3.client('sqs', config=_BOTO_CONFIG)
+s3_client = boto3.client('s3', config=_BOTO_CONFIG)
 
 # Get environment variables
 SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
 
+# Expected object key format: uploads/{user_id}/{filename}; precompiled so
+# each record costs a single C-level match instead of split + branch checks
+_KEY_RE = re.compile(r'^uploads/([^/]+)/(.+)$')
+
 def main(event, context):
     """Lambda handler for processing S3 upload events and enqueuing messages to SQS."""
-    print(f"=== S3 EVENT HANDLER STARTED ===")
-    print(f"Event received: {json.dumps(event, indent=2)}")
-    print(f"Context: RequestId={context.aws_request_id}, FunctionName={context.function_name}")
-    
+    logger.debug("S3 event handler started: RequestId=%s, %d records",
+                 context.aws_request_id, len(event['Records']))
+
     try:
-        # Process each S3 event
-        for i, record in enumerate(event['Records']):
-            print(f"Processing record {i+1}/{len(event['Records'])}")
-            process_s3_event(record)
-        
-        print(f"=== S3 EVENT HANDLER COMPLETED SUCCESSFULLY ===")
+        # Collect one SQS message per creation event, then send them in
+        # batches of 10: one SendMessageBatch round trip instead of one
+        # SendMessage per record
+        message_bodies = []
+        for record in event['Records']:
+            message_body = process_s3_event(record)
+            if message_body:
+                message_bodies.append(message_body)
+
+        if message_bodies:
+            send_sqs_messages(message_bodies)
+
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'S3 events processed successfully'})
+            'body': orjson.dumps({'message': 'S3 events processed successfully'}).decode()
         }
-        
+
     except Exception as e:
-        print(f"=== S3 EVENT HANDLER FAILED ===")
-        print(f"Error in S3 event handler: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in S3 event handler: %s", e)
         return {
             'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
+            'body': orjson.dumps({'error': 'Internal server error'}).decode()
         }
 
 def process_s3_event(record):
-    """Process a single S3 event record."""
-    print(f"--- Processing S3 Event Record ---")
+    """Process a single S3 event record and return its SQS message body."""
     try:
         # Extract S3 event information
         s3_event = record['s3']
         bucket_name = s3_event['bucket']['name']
         object_key = s3_event['object']['key']
         event_name = record['eventName']
-        
-        print(f"S3 Event Details:")
-        print(f"  - Event Name: {event_name}")
-        print(f"  - Bucket: {bucket_name}")
-        print(f"  - Object Key: {object_key}")
-        print(f"  - Object Size: {s3_event['object'].get('size', 'Unknown')}")
-        print(f"  - Event Time: {record.get('eventTime', 'Unknown')}")
-        
+
+        logger.debug("S3 event %s for s3://%s/%s", event_name, bucket_name, object_key)
+
         # Only process ObjectCreated events
         if not event_name.startswith('ObjectCreated'):
-            print(f"SKIPPING: Non-creation event detected: {event_name}")
-            return
-        
-        print(f"PROCESSING: ObjectCreated event confirmed")
-        
+            logger.debug("Skipping non-creation event: %s", event_name)
+            return None
+
         # Extract user information from object key
         # Format: uploads/{user_id}/{uuid}.{extension}
-        print(f"Extracting user info from object key: {object_key}")
         user_info = extract_user_info_from_key(object_key)
         if not user_info:
-            print(f"ERROR: Could not extract user info from object key: {object_key}")
-            print(f"Expected format: uploads/{{user_id}}/{{uuid}}.{{extension}}")
-            return
-        
-        print(f"User info extracted successfully:")
-        print(f"  - User ID: {user_info['user_id']}")
-        print(f"  - Filename: {user_info['filename']}")
-        
+            logger.warning("Could not extract user info from object key: %s", object_key)
+            return None
+
         # Prepare SQS message
         message_body = {
             'image_id': object_key,
@@ -86,115 +93,73 @@ def process_s3_event(record):
             'file_size': s3_event['object']['size'],
             'event_timestamp': record['eventTime'],
             'event_name': event_name,
-            'upload_timestamp': datetime.utcnow().isoformat(),
+            'upload_timestamp': datetime.now(timezone.utc).isoformat(),
             'original_filename': user_info['filename']
         }
-        
-        print(f"SQS Message prepared:")
-        print(f"  - Image ID: {message_body['image_id']}")
-        print(f"  - User ID: {message_body['user_id']}")
-        print(f"  - File Size: {message_body['file_size']}")
-        print(f"  - Upload Timestamp: {message_body['upload_timestamp']}")
-        
-        # Send message to SQS
-        send_sqs_message(message_body)
-        
-        print(f"SUCCESS: Message enqueued for image: {object_key}")
-        
+
+        logger.debug("Message prepared for image: %s", object_key)
+
+        return message_body
+
     except Exception as e:
-        print(f"ERROR: Failed to process S3 event")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Failed to process S3 event: %s", e)
         raise
 
 def extract_user_info_from_key(object_key):
     """Extract user information from S3 object key."""
-    print(f"Extracting user info from key: {object_key}")
-    try:
-        # Expected format: uploads/{user_id}/{uuid}.{extension}
-        parts = object_key.split('/')
-        print(f"Key parts: {parts}")
-        
-        if len(parts) != 3:
-            print(f"ERROR: Invalid key format. Expected 3 parts, got {len(parts)}")
-            return None
-        
-        if parts[0] != 'uploads':
-            print(f"ERROR: Key does not start with 'uploads'. Got: {parts[0]}")
-            return None
-        
-        user_id = parts[1]
-        filename = parts[2]
-        
-        print(f"Parsed components:")
-        print(f"  - User ID: {user_id}")
-        print(f"  - Filename: {filename}")
-        
-        # Validate user_id is not empty
-        if not user_id:
-            print(f"ERROR: User ID is empty")
-            return None
-        
-        result = {
-            'user_id': user_id,
-            'filename': filename
-        }
-        
-        print(f"User info extraction successful: {result}")
-        return result
-        
-    except Exception as e:
-        print(f"ERROR: Failed to extract user info from object key")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+    match = _KEY_RE.match(object_key)
+    if not match:
+        logger.debug("Object key does not match uploads/{user_id}/{filename}: %s", object_key)
         return None
 
-def send_sqs_message(message_body):
-    """Send message to SQS queue."""
-    print(f"Sending message to SQS queue: {SQS_QUEUE_URL}")
+    return {
+        'user_id': match[1],
+        'filename': match[2]
+    }
+
+def send_sqs_messages(message_bodies):
+    """Send messages to the SQS queue in batches of up to 10."""
     try:
-        message_attributes = {
-            'MessageType': {
-                'StringValue': 'ImageUploadEvent',
-                'DataType': 'String'
-            },
-            'UserId': {
-                'StringValue': message_body['user_id'],
-                'DataType': 'String'
-            },
-            'ImageId': {
-                'StringValue': message_body['image_id'],
-                'DataType': 'String'
-            }
-        }
-        
-        print(f"Message attributes:")
-        for key, value in message_attributes.items():
-            print(f"  - {key}: {value['StringValue']}")
-        
-        response = sqs_client.send_message(
-            QueueUrl=SQS_QUEUE_URL,
-            MessageBody=json.dumps(message_body),
-            MessageAttributes=message_attributes
-        )
-        
-        print(f"SUCCESS: Message sent to SQS")
-        print(f"  - Message ID: {response['MessageId']}")
-        print(f"  - MD5: {response['MD5OfMessageBody']}")
-        
+        failed = []
+
+        for offset in range(0, len(message_bodies), 10):
+            entries = []
+            for i, message_body in enumerate(message_bodies[offset:offset + 10]):
+                entries.append({
+                    'Id': str(offset + i),
+                    'MessageBody': orjson.dumps(message_body).decode(),
+                    'MessageAttributes': {
+                        'MessageType': {
+                            'StringValue': 'ImageUploadEvent',
+                            'DataType': 'String'
+                        },
+                        'UserId': {
+                            'StringValue': message_body['user_id'],
+                            'DataType': 'String'
+                        },
+                        'ImageId': {
+                            'StringValue': message_body['image_id'],
+                            'DataType': 'String'
+                        }
+                    }
+                })
+
+            response = sqs_client.send_message_batch(
+                QueueUrl=SQS_QUEUE_URL,
+                Entries=entries
+            )
+
+            failed.extend(response.get('Failed', []))
+
+        if failed:
+            for failure in failed:
+                logger.error("Failed to enqueue message %s: %s - %s",
+                             failure['Id'], failure.get('Code'), failure.get('Message'))
+            raise Exception(f"{len(failed)} of {len(message_bodies)} SQS messages failed to send")
+
+        logger.debug("%d messages sent to SQS", len(message_bodies))
+
     except ClientError as e:
-        print(f"ERROR: Failed to send message to SQS")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Failed to send messages to SQS: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         raise
-    except Exception as e:
-        print(f"ERROR: Unexpected error sending message to SQS")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        raise 
\ No newline at end of file
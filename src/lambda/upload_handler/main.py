@@ -1,272 +1,302 @@
-import json
-import boto3
+import logging
+import time
+import hashlib
+import orjson
+import hmac
 import os
-import uuid
-from datetime import datetime, timedelta
+import secrets
+from datetime import datetime, timezone
+from urllib.parse import quote
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from botocore.session import Session
 
-# Initialize AWS clients
-s3_client = boto3.client('s3', config=boto3.session.Config(signature_version='s3v4'))
-cognito_client = boto3.client('cognito-idp')
+# Shared client config: keep the HTTPS sockets alive across warm
+# invocations so each AWS call skips the TCP+TLS handshake
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=10,
+                      retries={'max_attempts': 3, 'mode': 'standard'})
+
+# Initialize AWS clients straight from botocore: the handler only calls
+# Cognito GetUser (URLs are signed locally), so importing boto3's resource
+# machinery would be pure cold-start overhead. The old s3 client is gone
+# for the same reason.
+_SESSION = Session()
+cognito_client = _SESSION.create_client('cognito-idp', config=_BOTO_CONFIG)
 
 # Get environment variables
 INPUT_BUCKET = os.environ.get('INPUT_BUCKET')
 USER_POOL_ID = os.environ.get('USER_POOL_ID')
 CLIENT_ID = os.environ.get('CLIENT_ID')
 
+# Static response pieces shared by every response; API Gateway's proxy
+# integration copies the response, so reusing one headers dict is safe
+_CORS_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+_CORS_PREFLIGHT_RESPONSE = {'statusCode': 200, 'headers': _CORS_HEADERS, 'body': '{}'}
+
+# Accepted upload types and their extensions; the frozenset gives the
+# validation check a single hash probe
+_EXT_BY_MIME = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif'}
+_ALLOWED_MIME = frozenset(_EXT_BY_MIME)
+
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
+# Signing context for the hand-rolled SigV4 presigner below, resolved once
+# at module load. Credentials stay refreshable; each call freezes them
+# cheaply instead of walking botocore's full presign stack.
+_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+_CREDENTIALS = _SESSION.get_credentials()
+_S3_HOST = f"{INPUT_BUCKET}.s3.{_REGION}.amazonaws.com"
+_KMS_KEY_ID = os.environ.get('S3_KMS_KEY_ID', 'alias/aws/s3')
+
+# Everything in the signed-header block except content-type is static, so
+# the SignedHeaders list and the tail of the canonical header block are
+# built once here. The SSE-KMS headers are signed because the bucket
+# policy enforces SSE-KMS on every PUT.
+_SIGNED_HEADERS = 'content-type;host;x-amz-server-side-encryption;x-amz-server-side-encryption-aws-kms-key-id'
+_CANONICAL_HEADERS_SUFFIX = (
+    f"host:{_S3_HOST}\n"
+    "x-amz-server-side-encryption:aws:kms\n"
+    f"x-amz-server-side-encryption-aws-kms-key-id:{_KMS_KEY_ID}\n"
+)
+
+# SigV4 signing keys only vary by day (and key id), so derive them once
+# and reuse across invocations
+_SIGNING_KEY_CACHE = {}
+
+# Cognito GetUser cache: sha256(token) -> (user_info, expiry). Uploads often
+# arrive in bursts from one client with the same access token; a short TTL
+# skips the Cognito round trip on warm repeats while staying well inside the
+# token's own lifetime. Keyed by digest so raw tokens never sit in memory.
+_USER_CACHE = {}
+_USER_CACHE_TTL = 60  # seconds
+_USER_CACHE_MAX = 1024
+
+def _get_signing_key(secret_key, date_stamp):
+    """Derive (and cache) the SigV4 signing key for a given day."""
+    cache_key = (secret_key, date_stamp)
+    signing_key = _SIGNING_KEY_CACHE.get(cache_key)
+    if signing_key is None:
+        key = hmac.new(('AWS4' + secret_key).encode(), date_stamp.encode(), hashlib.sha256).digest()
+        key = hmac.new(key, _REGION.encode(), hashlib.sha256).digest()
+        key = hmac.new(key, b's3', hashlib.sha256).digest()
+        signing_key = hmac.new(key, b'aws4_request', hashlib.sha256).digest()
+        if len(_SIGNING_KEY_CACHE) > 4:
+            _SIGNING_KEY_CACHE.clear()
+        _SIGNING_KEY_CACHE[cache_key] = signing_key
+    return signing_key
+
 def main(event, context):
     """Lambda handler for generating S3 pre-signed URLs for image upload."""
-    print(f"=== UPLOAD HANDLER STARTED ===")
-    print(f"Event received: {json.dumps(event, indent=2)}")
-    print(f"Context: RequestId={context.aws_request_id}, FunctionName={context.function_name}")
-    print(f"Environment variables:")
-    print(f"  - INPUT_BUCKET: {INPUT_BUCKET}")
-    print(f"  - USER_POOL_ID: {USER_POOL_ID}")
-    print(f"  - CLIENT_ID: {CLIENT_ID}")
-    
+    # Preflights block the browser's real request, so answer them before
+    # any logging or dispatch work
+    if event.get('httpMethod') == 'OPTIONS':
+        return _CORS_PREFLIGHT_RESPONSE
+
+    logger.debug("Upload handler started: RequestId=%s", context.aws_request_id)
+
     try:
         # Parse the event
         http_method = event.get('httpMethod', '')
-        print(f"HTTP Method: {http_method}")
-        
+
         if http_method == 'POST':
             return handle_upload_request(event)
-        elif http_method == 'OPTIONS':
-            return handle_cors_preflight()
         else:
-            print(f"ERROR: Unsupported HTTP method: {http_method}")
+            logger.warning("Unsupported HTTP method: %s", http_method)
             return create_response(405, {'error': 'Method not allowed'})
-            
+
     except Exception as e:
-        print(f"=== UPLOAD HANDLER FAILED ===")
-        print(f"Error in upload handler: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in upload handler: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
 def handle_upload_request(event):
     """Handle upload request and generate pre-signed URL."""
-    print(f"--- Handling Upload Request ---")
     try:
         # Validate authorization header
-        auth_header = event.get('headers', {}).get('Authorization', '')
-        print(f"Authorization header: {auth_header[:20]}..." if len(auth_header) > 20 else f"Authorization header: {auth_header}")
-        
+        auth_header = (event.get('headers') or {}).get('Authorization', '')
+
         if not auth_header.startswith('Bearer '):
-            print(f"ERROR: Invalid authorization header format")
             return create_response(401, {'error': 'Authorization header required'})
-        
-        token = auth_header.split(' ')[1]
-        print(f"Token extracted (first 20 chars): {token[:20]}...")
-        
+
+        # Slice past the "Bearer " prefix; split would allocate a list and
+        # scan the whole header
+        token = auth_header[7:]
+
         # Validate token and get user info
-        print(f"Validating token with Cognito...")
         user_info = validate_token(token)
         if not user_info:
-            print(f"ERROR: Token validation failed")
             return create_response(401, {'error': 'Invalid token'})
-        
-        print(f"Token validation successful:")
-        print(f"  - User ID: {user_info['sub']}")
-        print(f"  - Email: {user_info['email']}")
-        print(f"  - Email Verified: {user_info['email_verified']}")
-        
+
         # Parse request body
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(event.get('body') or b'{}')
         file_name = body.get('fileName')
         file_type = body.get('fileType')
-        
-        print(f"Request body parameters:")
-        print(f"  - File Name: {file_name}")
-        print(f"  - File Type: {file_type}")
-        
+
         if not file_name or not file_type:
-            print(f"ERROR: Missing required parameters")
             return create_response(400, {'error': 'fileName and fileType are required'})
-        
+
         # Validate file type
-        allowed_types = ['image/jpeg', 'image/png', 'image/gif']
-        print(f"Validating file type: {file_type}")
-        print(f"Allowed types: {allowed_types}")
-        
-        if file_type not in allowed_types:
-            print(f"ERROR: Invalid file type: {file_type}")
+        if file_type not in _ALLOWED_MIME:
             return create_response(400, {'error': 'Invalid file type. Only JPEG, PNG, and GIF are allowed.'})
-        
-        print(f"✓ File type validation passed")
-        
+
         # Validate Content-Type format
         if not file_type or '/' not in file_type or len(file_type.split('/')) != 2:
-            print(f"ERROR: Invalid Content-Type format: {file_type}")
             return create_response(400, {'error': 'Invalid Content-Type format. Must be in format: type/subtype'})
-        
-        print(f"✓ Content-Type format validation passed")
-        
-        # Generate unique file key
-        file_extension = get_file_extension(file_type)
-        file_key = f"uploads/{user_info['sub']}/{uuid.uuid4()}{file_extension}"
-        
-        print(f"Generated file key:")
-        print(f"  - Extension: {file_extension}")
-        print(f"  - Full key: {file_key}")
-        
-        # Generate pre-signed URL
-        print(f"Generating pre-signed URL...")
-        presigned_url = generate_presigned_url(file_key, file_type, user_info)
-        
-        print(f"Pre-signed URL generated successfully")
-        print(f"  - URL length: {len(presigned_url)} characters")
-        print(f"  - URL preview: {presigned_url[:100]}...")
-        
+
+        # Generate unique file key; the membership check above guarantees
+        # the extension lookup hits. token_hex gives the same 128 bits of
+        # entropy as uuid4 without UUID object construction and formatting.
+        file_extension = _EXT_BY_MIME[file_type]
+        object_name = f"{secrets.token_hex(16)}{file_extension}"
+        file_key = f"uploads/{user_info['sub']}/{object_name}"
+
+        # Generate pre-signed URL. The hex name and extension are
+        # unreserved characters and the sub segment was encoded when it
+        # entered the user cache, so no percent-encoding scan runs here.
+        canonical_uri = f"/uploads/{user_info['sub_quoted']}/{object_name}"
+        presigned_url = generate_presigned_url(canonical_uri, file_type)
+
+        logger.debug("Pre-signed URL generated for key %s", file_key)
+
         response_data = {
             'uploadUrl': presigned_url,
             'fileKey': file_key,
             'expiresIn': 3600  # 1 hour
         }
-        
-        print(f"Response data prepared:")
-        print(f"  - File Key: {response_data['fileKey']}")
-        print(f"  - Expires In: {response_data['expiresIn']} seconds")
-        
+
         return create_response(200, response_data)
-        
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse JSON in request body")
-        print(f"Error details: {str(e)}")
+
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to parse JSON in request body: %s", e)
         return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
-        print(f"ERROR: Failed to handle upload request")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Failed to handle upload request: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
 def validate_token(token):
     """Validate JWT token and return user information."""
-    print(f"Validating token with Cognito...")
+    cache_key = hashlib.sha256(token.encode()).digest()
+    entry = _USER_CACHE.get(cache_key)
+    if entry and entry[1] > time.monotonic():
+        logger.debug("User cache hit for user %s", entry[0]['sub'])
+        return entry[0]
+
     try:
         response = cognito_client.get_user(
             AccessToken=token
         )
-        
-        print(f"Cognito response received:")
-        print(f"  - Username: {response['Username']}")
-        print(f"  - User Attributes Count: {len(response['UserAttributes'])}")
-        
-        # Extract user attributes
-        user_attributes = {attr['Name']: attr['Value'] for attr in response['UserAttributes']}
-        
+
+        # Pull just the two attributes we use instead of building a dict of
+        # all of them, stopping as soon as both have been seen
+        email = ''
+        email_verified = False
+        for attr in response['UserAttributes']:
+            name = attr['Name']
+            if name == 'email':
+                email = attr['Value']
+            elif name == 'email_verified':
+                email_verified = attr['Value'] == 'true'
+            if email and email_verified:
+                break
+
         user_info = {
             'sub': response['Username'],
-            'email': user_attributes.get('email', ''),
-            'email_verified': user_attributes.get('email_verified', 'false') == 'true'
+            # Percent-encoded once here so the presigner's canonical URI is
+            # a plain f-string; for Cognito UUID subs this is a no-op
+            'sub_quoted': quote(response['Username'], safe=''),
+            'email': email,
+            'email_verified': email_verified
         }
-        
-        print(f"User info extracted:")
-        print(f"  - Sub: {user_info['sub']}")
-        print(f"  - Email: {user_info['email']}")
-        print(f"  - Email Verified: {user_info['email_verified']}")
-        
+
+        if len(_USER_CACHE) >= _USER_CACHE_MAX:
+            # Evict the oldest entry (insertion order) to cap memory
+            _USER_CACHE.pop(next(iter(_USER_CACHE)))
+        _USER_CACHE[cache_key] = (user_info, time.monotonic() + _USER_CACHE_TTL)
+
         return user_info
-        
+
     except ClientError as e:
-        print(f"ERROR: Cognito token validation failed")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Cognito token validation failed: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         return None
     except Exception as e:
-        print(f"ERROR: Unexpected error during token validation")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error during token validation: %s", e)
         return None
 
-def generate_presigned_url(file_key, file_type, user_info):
-    """Generate pre-signed URL for S3 upload with SSE-KMS."""
-    print(f"Generating pre-signed URL for S3 upload...")
-    print(f"  - File Key: {file_key}")
-    print(f"  - File Type: {file_type}")
-    print(f"  - User ID: {user_info['sub']}")
-    
+def generate_presigned_url(canonical_uri, file_type):
+    """Generate pre-signed URL for S3 upload with SSE-KMS.
+
+    Expects an already percent-encoded canonical URI.
+    """
     try:
-        # Get KMS key ID from environment
-        kms_key_id = os.environ.get('S3_KMS_KEY_ID', 'alias/aws/s3')
-        print(f"  - KMS Key ID: {kms_key_id}")
-        
-        # Generate pre-signed URL with explicit SSE-KMS parameters
-        # This is required due to the bucket policy that enforces SSE-KMS
-        presigned_params = {
-            'Bucket': INPUT_BUCKET,
-            'Key': file_key,
-            'ContentType': file_type,
-            'ServerSideEncryption': 'aws:kms',
-            'SSEKMSKeyId': kms_key_id
+        # Sign the URL directly instead of going through botocore's
+        # generate_presigned_url, which walks the whole event/serializer/
+        # endpoint stack to produce one query string
+        credentials = _CREDENTIALS.get_frozen_credentials()
+
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = now.strftime('%Y%m%d')
+        credential_scope = f"{date_stamp}/{_REGION}/s3/aws4_request"
+
+        canonical_headers = f"content-type:{file_type}\n" + _CANONICAL_HEADERS_SUFFIX
+
+        query = {
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f"{credentials.access_key}/{credential_scope}",
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': '7200',  # 2 hours - increased for debugging
+            'X-Amz-SignedHeaders': _SIGNED_HEADERS
         }
-        
-        print(f"Pre-signed URL parameters:")
-        for key, value in presigned_params.items():
-            print(f"    - {key}: {value}")
-        
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params=presigned_params,
-            ExpiresIn=7200  # 2 hours - increased for debugging
-        )
-        
-        print(f"Pre-signed URL generated successfully:")
-        print(f"  - URL length: {len(presigned_url)} characters")
-        print(f"  - Expires in: 7200 seconds (2 hours)")
-        print(f"  - SSE-KMS enabled with key: {kms_key_id}")
-        
-        return presigned_url
-        
+        if credentials.token:
+            query['X-Amz-Security-Token'] = credentials.token
+
+        canonical_query = '&'.join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, value in sorted(query.items()))
+
+        canonical_request = '\n'.join([
+            'PUT',
+            canonical_uri,
+            canonical_query,
+            canonical_headers,
+            _SIGNED_HEADERS,
+            'UNSIGNED-PAYLOAD'
+        ])
+
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256',
+            amz_date,
+            credential_scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+
+        signing_key = _get_signing_key(credentials.secret_key, date_stamp)
+        signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        return f"https://{_S3_HOST}{canonical_uri}?{canonical_query}&X-Amz-Signature={signature}"
+
     except Exception as e:
-        print(f"ERROR: Failed to generate pre-signed URL")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        # The caller's handler logs the traceback; formatting it twice
+        # would just duplicate the frame walk
+        logger.error("Failed to generate pre-signed URL: %s", e)
         raise
 
-def get_file_extension(file_type):
-    """Get file extension based on MIME type."""
-    extensions = {
-        'image/jpeg': '.jpg',
-        'image/png': '.png',
-        'image/gif': '.gif'
-    }
-    
-    extension = extensions.get(file_type, '')
-    print(f"File extension mapping:")
-    print(f"  - MIME Type: {file_type}")
-    print(f"  - Extension: {extension}")
-    
-    return extension
-
-def handle_cors_preflight():
-    """Handle CORS preflight requests."""
-    print(f"Handling CORS preflight request")
-    return create_response(200, {})
-
 def create_response(status_code, body):
     """Create a standardized API Gateway response."""
-    print(f"Creating API Gateway response:")
-    print(f"  - Status Code: {status_code}")
-    print(f"  - Body: {json.dumps(body, indent=2) if isinstance(body, dict) else str(body)}")
-    
-    response = {
+    return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        },
-        'body': json.dumps(body)
+        'headers': _CORS_HEADERS,
+        'body': orjson.dumps(body).decode()
     }
-    
-    print(f"Response created successfully")
-    return response 
\ No newline at end of file
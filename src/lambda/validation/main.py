@@ -1,84 +1,86 @@
-import json
-import boto3
+import logging
 import os
-import imghdr
 # Remove PIL import to avoid _imaging issues
 # from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, wait
 from io import BytesIO
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from datetime import datetime
+from botocore.session import Session
+from datetime import datetime, timezone
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
-dynamodb_client = boto3.client('dynamodb')
+# Shared client config: keep the HTTPS sockets alive across warm
+# invocations so each AWS call skips the TCP+TLS handshake
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=10,
+                      retries={'max_attempts': 3, 'mode': 'standard'})
+
+# Initialize AWS clients straight from botocore; boto3's resource layer
+# is never used here and skipping its import trims cold start
+_SESSION = Session()
+s3_client = _SESSION.create_client('s3', config=_BOTO_CONFIG)
+dynamodb_client = _SESSION.create_client('dynamodb', config=_BOTO_CONFIG)
 
 # Get environment variables
 INPUT_BUCKET = os.environ.get('INPUT_BUCKET')
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET')
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE')
 
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
+# Background pool for the success-path status write: the handler never
+# reads that result, so the DynamoDB round trip overlaps with returning to
+# Step Functions. Pending futures are tracked so exceptions aren't dropped
+# and so main() can give the write a moment to reach the socket before the
+# sandbox freezes.
+_BG_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+_PENDING_WRITES = set()
+
 # Validation constants
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-ALLOWED_FORMATS = ['jpeg', 'jpg', 'png', 'gif']
+ALLOWED_FORMATS = ('jpeg', 'jpg', 'png', 'gif')
 MIN_DIMENSIONS = (100, 100)  # Minimum width and height
 
 def main(event, context):
     """Lambda handler for image validation."""
-    print(f"=== VALIDATION STARTED ===")
-    print(f"Event received: {json.dumps(event, indent=2)}")
-    print(f"Context: RequestId={context.aws_request_id}, FunctionName={context.function_name}")
-    print(f"Environment variables:")
-    print(f"  - INPUT_BUCKET: {INPUT_BUCKET}")
-    print(f"  - OUTPUT_BUCKET: {OUTPUT_BUCKET}")
-    print(f"  - DYNAMODB_TABLE: {DYNAMODB_TABLE}")
-    print(f"Validation constants:")
-    print(f"  - MAX_FILE_SIZE: {MAX_FILE_SIZE} bytes ({MAX_FILE_SIZE/1024/1024:.1f} MB)")
-    print(f"  - ALLOWED_FORMATS: {ALLOWED_FORMATS}")
-    print(f"  - MIN_DIMENSIONS: {MIN_DIMENSIONS}")
-    
+    logger.debug("Validation started: RequestId=%s", context.aws_request_id)
+
     try:
         # Parse input from Step Functions
         input_data = event
-        
+
         image_id = input_data['image_id']
         bucket_name = input_data['bucket_name']
         user_id = input_data['user_id']
         user_email = input_data['user_email']
-        
-        print(f"Validation parameters:")
-        print(f"  - Image ID: {image_id}")
-        print(f"  - Bucket Name: {bucket_name}")
-        print(f"  - User ID: {user_id}")
-        print(f"  - User Email: {user_email}")
-        
-        print(f"Starting validation for image: {image_id}")
-        
+
+        logger.debug("Validating image %s from bucket %s for user %s",
+                     image_id, bucket_name, user_id)
+
         # Download image from S3
-        print(f"Downloading image from S3...")
-        image_data = download_image(bucket_name, image_id)
-        if not image_data:
+        downloaded = download_image(bucket_name, image_id)
+        if not downloaded:
             raise Exception(f"Failed to download image: {image_id}")
-        
-        print(f"Image downloaded successfully:")
-        print(f"  - Size: {len(image_data)} bytes")
-        
+        image_data, content_length = downloaded
+
         # Validate image
-        print(f"Starting image validation...")
-        validation_result = validate_image(image_data, image_id)
-        
-        print(f"Validation completed:")
-        print(f"  - Is Valid: {validation_result['is_valid']}")
-        if 'error' in validation_result:
-            print(f"  - Error: {validation_result['error']}")
-        if 'image_info' in validation_result:
-            print(f"  - Image Info: {validation_result['image_info']}")
-        
+        validation_result = validate_image(image_data, content_length, image_id)
+
         if validation_result['is_valid']:
-            # Update DynamoDB status
-            print(f"Updating DynamoDB with validation success...")
-            update_validation_status(image_id, 'validated', validation_result)
-            
-            print(f"=== VALIDATION COMPLETED SUCCESSFULLY ===")
+            # Update DynamoDB status in the background; the error branches
+            # below stay synchronous because their callers re-raise
+            future = _BG_EXECUTOR.submit(
+                update_validation_status, image_id, 'validated', validation_result)
+            _PENDING_WRITES.add(future)
+            future.add_done_callback(_PENDING_WRITES.discard)
+            wait(_PENDING_WRITES, timeout=0.05)
+
             # Return success for Step Functions
             return {
                 'statusCode': 200,
@@ -88,158 +90,147 @@ def main(event, context):
             }
         else:
             # Update DynamoDB status
-            print(f"Updating DynamoDB with validation failure...")
             update_validation_status(image_id, 'validation_failed', validation_result)
-            
-            print(f"=== VALIDATION FAILED ===")
+
             # Return error for Step Functions
             raise Exception(f"Image validation failed: {validation_result['error']}")
-            
+
     except Exception as e:
-        print(f"=== VALIDATION FAILED ===")
-        print(f"Error in validation: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in validation: %s", e)
         # Update DynamoDB with error status
         if 'image_id' in locals():
             update_validation_status(image_id, 'validation_error', {'error': str(e)})
         raise
 
 def download_image(bucket_name, image_id):
-    """Download image from S3."""
-    print(f"Downloading image from S3...")
-    print(f"  - Bucket: {bucket_name}")
-    print(f"  - Key: {image_id}")
-    
+    """Download image from S3; returns (image_data, content_length).
+
+    Oversize objects are not transferred: the body comes back as None with
+    the reported length, so validate_image can record the specific size
+    failure instead of a generic download error.
+    """
     try:
+        # One cheap HEAD up front: an oversize upload is caught after a
+        # single round trip instead of being fully downloaded just to be
+        # rejected
+        head = s3_client.head_object(Bucket=bucket_name, Key=image_id)
+        content_length = head['ContentLength']
+        if content_length > MAX_FILE_SIZE:
+            logger.warning("Skipping download of s3://%s/%s: %d bytes exceeds limit %d",
+                           bucket_name, image_id, content_length, MAX_FILE_SIZE)
+            return None, content_length
+
         response = s3_client.get_object(
             Bucket=bucket_name,
             Key=image_id
         )
-        
+
         image_data = response['Body'].read()
-        
-        print(f"Image download successful:")
-        print(f"  - Content Length: {response.get('ContentLength', 'Unknown')}")
-        print(f"  - Content Type: {response.get('ContentType', 'Unknown')}")
-        print(f"  - ETag: {response.get('ETag', 'Unknown')}")
-        print(f"  - Actual data size: {len(image_data)} bytes")
-        
-        return image_data
-        
+
+        logger.debug("Downloaded s3://%s/%s (%d bytes)",
+                     bucket_name, image_id, content_length)
+
+        return image_data, content_length
+
     except ClientError as e:
-        print(f"ERROR: Failed to download image from S3")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Failed to download image from S3: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         return None
     except Exception as e:
-        print(f"ERROR: Unexpected error downloading image")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error downloading image: %s", e)
         return None
 
-def validate_image(image_data, image_id):
-    """Validate image file type, size, and integrity without PIL."""
-    print(f"--- Image Validation Process (No PIL) ---")
+def validate_image(image_data, content_length, image_id):
+    """Validate image file type, size, and integrity without PIL.
+
+    image_data is None when the download was skipped for size; the size
+    check below turns that into the specific validation failure.
+    """
     try:
-        # Check file size
-        file_size = len(image_data)
-        print(f"File size validation:")
-        print(f"  - Actual size: {file_size} bytes ({file_size/1024/1024:.2f} MB)")
-        print(f"  - Max allowed: {MAX_FILE_SIZE} bytes ({MAX_FILE_SIZE/1024/1024:.2f} MB)")
-        
+        # Check file size against what S3 reported (trusted: S3 set it,
+        # not the client) rather than measuring the downloaded body
+        file_size = content_length
+
         if file_size > MAX_FILE_SIZE:
             error_msg = f'File size {file_size} exceeds maximum allowed size {MAX_FILE_SIZE}'
-            print(f"VALIDATION FAILED: {error_msg}")
-            return {
-                'is_valid': False,
-                'error': error_msg
-            }
-        
-        print(f"✓ File size validation passed")
-        
-        # Check file format using imghdr
-        print(f"File format validation using imghdr...")
-        image_format = imghdr.what(None, h=image_data)
-        print(f"  - Detected format: {image_format}")
-        print(f"  - Allowed formats: {ALLOWED_FORMATS}")
-        
-        if not image_format or image_format.lower() not in ALLOWED_FORMATS:
-            error_msg = f'Invalid file format: {image_format}. Allowed formats: {ALLOWED_FORMATS}'
-            print(f"VALIDATION FAILED: {error_msg}")
+            logger.warning("Validation failed for %s: %s", image_id, error_msg)
             return {
                 'is_valid': False,
                 'error': error_msg
             }
-        
-        print(f"✓ File format validation passed")
-        
-        # Basic file header validation for common image formats
-        print(f"File header validation...")
-        if not validate_image_headers(image_data, image_format):
-            error_msg = f'Invalid image file header for format: {image_format}'
-            print(f"VALIDATION FAILED: {error_msg}")
+
+        # Check the magic bytes directly; this replaces imghdr's list of
+        # per-format test functions plus a second header pass
+        image_format = detect_format(image_data)
+
+        if not image_format:
+            error_msg = f'Invalid or corrupt image file. Allowed formats: {ALLOWED_FORMATS}'
+            logger.warning("Validation failed for %s: %s", image_id, error_msg)
             return {
                 'is_valid': False,
                 'error': error_msg
             }
-        
-        print(f"✓ File header validation passed")
-        
+
         # For now, skip dimension validation without PIL
         # We'll do dimension validation in the resize function instead
-        print(f"⚠️  Skipping dimension validation (will be done in resize function)")
-        
+
         # Return success with basic image info
         image_info = {
             'format': image_format,
             'size_bytes': file_size,
             'dimensions_validated': False  # Will be validated in resize function
         }
-        
-        print(f"✓ Basic image validation completed successfully")
+
+        logger.debug("Image %s validated: %s, %d bytes", image_id, image_format, file_size)
         return {
             'is_valid': True,
             'image_info': image_info
         }
-        
+
     except Exception as e:
-        print(f"ERROR: Validation failed with exception")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Validation failed with exception: %s", e)
         return {
             'is_valid': False,
             'error': f'Validation error: {str(e)}'
         }
 
-def validate_image_headers(image_data, format_type):
-    """Validate image file headers for common formats."""
-    if not image_data or len(image_data) < 8:
-        return False
-    
-    # JPEG validation
-    if format_type in ['jpeg', 'jpg']:
-        return image_data[:2] == b'\xff\xd8' and image_data[-2:] == b'\xff\xd9'
-    
-    # PNG validation
-    elif format_type == 'png':
-        return image_data[:8] == b'\x89PNG\r\n\x1a\n'
-    
-    # GIF validation
-    elif format_type == 'gif':
-        return image_data[:6] in [b'GIF87a', b'GIF89a']
-    
-    # For other formats, assume valid if imghdr detected them
-    return True
+def detect_format(data):
+    """Detect and validate the image format from its magic bytes.
+
+    One pass over at most ten bytes: startswith and the two tiny slices
+    run in C without copying the image body. The JPEG check doubles as the
+    old header validation by requiring the EOI trailer.
+    """
+    if not data or len(data) < 8:
+        return None
+
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:2] == b'\xff\xd8' and data[-2:] == b'\xff\xd9':
+        return 'jpeg'
+
+    return None
+
+def _to_ddb(value):
+    """Convert a plain Python value to its DynamoDB attribute form."""
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float)):
+        return {'N': str(value)}
+    if isinstance(value, dict):
+        return {'M': {key: _to_ddb(val) for key, val in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [_to_ddb(val) for val in value]}
+    if value is None:
+        return {'NULL': True}
+    return {'S': str(value)}
 
 def update_validation_status(image_id, status, validation_result):
     """Update DynamoDB with validation status."""
-    print(f"Updating DynamoDB validation status...")
     try:
         update_expression = "SET #status = :status, #validation_result = :validation_result, #updated_at = :updated_at"
         expression_attribute_names = {
@@ -249,16 +240,12 @@ def update_validation_status(image_id, status, validation_result):
         }
         expression_attribute_values = {
             ':status': {'S': status},
-            ':validation_result': {'S': json.dumps(validation_result)},
-            ':updated_at': {'S': datetime.utcnow().isoformat()}
+            # Stored as a native Map: no JSON serialization on the write
+            # path, and the fields stay individually queryable
+            ':validation_result': _to_ddb(validation_result),
+            ':updated_at': {'S': datetime.now(timezone.utc).isoformat(timespec='seconds')}
         }
-        
-        print(f"DynamoDB update parameters:")
-        print(f"  - Table: {DYNAMODB_TABLE}")
-        print(f"  - Image ID: {image_id}")
-        print(f"  - Status: {status}")
-        print(f"  - Validation Result: {json.dumps(validation_result, indent=2)}")
-        
+
         dynamodb_client.update_item(
             TableName=DYNAMODB_TABLE,
             Key={
@@ -268,18 +255,13 @@ def update_validation_status(image_id, status, validation_result):
             ExpressionAttributeNames=expression_attribute_names,
             ExpressionAttributeValues=expression_attribute_values
         )
-        
-        print(f"SUCCESS: DynamoDB validation status updated for image: {image_id}")
-        
+
+        logger.debug("DynamoDB validation status updated for image %s: %s", image_id, status)
+
     except ClientError as e:
-        print(f"ERROR: Failed to update DynamoDB validation status")
-        print(f"Error code: {e.response['Error']['Code']}")
-        print(f"Error message: {e.response['Error']['Message']}")
+        logger.error("Failed to update DynamoDB validation status: %s - %s",
+                     e.response['Error']['Code'], e.response['Error']['Message'])
         # Don't raise here as this is not critical for validation
     except Exception as e:
-        print(f"ERROR: Unexpected error updating DynamoDB validation status")
-        print(f"Error details: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        # Don't raise here as this is not critical for validation 
\ No newline at end of file
+        logger.exception("Unexpected error updating DynamoDB validation status: %s", e)
+        # Don't raise here as this is not critical for validation
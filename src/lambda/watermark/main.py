@@ -1,14 +1,32 @@
-import json
+import logging
 import boto3
 import os
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Shared client config: keep sockets alive across warm invocations and size
+# the urllib3 pool so concurrent calls don't re-handshake TLS
+_BOTO_CONFIG = Config(max_pool_connections=32, tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'adaptive'})
 
 # Initialize AWS clients
-s3_client = boto3.client('s3')
-dynamodb_client = boto3.client('dynamodb')
+s3_client = boto3.client('s3', config=_BOTO_CONFIG)
+dynamodb_client = boto3.client('dynamodb', config=_BOTO_CONFIG)
+
+# Shared worker pool, reused across warm invocations, for overlapping the
+# independent S3 and DynamoDB writes at the end of the handler
+_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+# Upload settings: outputs under 8MB go out as today's single PUT, larger
+# ones are split into parts uploaded on 4 connections so one TCP stream's
+# throughput ceiling no longer bounds the transfer
+_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                  multipart_chunksize=8 * 1024 * 1024,
+                                  max_concurrency=4)
 
 # Get environment variables
 INPUT_BUCKET = os.environ.get('INPUT_BUCKET')
@@ -16,19 +34,180 @@ OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET')
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE')
 KMS_KEY_ID = os.environ.get('KMS_KEY_ID', 'alias/aws/s3')
 
+# Module-level logger; default to WARNING so debug chatter (and its string
+# formatting) is skipped entirely on the hot path unless explicitly enabled
+logger = logging.getLogger(__name__)
+try:
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    # A typo in the knob must not take the function down at import
+    logger.setLevel(logging.WARNING)
+
 # Watermark configurations
 WATERMARK_TEXT = os.environ.get('WATERMARK_TEXT', 'PROCESSED')
 WATERMARK_FONT_SIZE = int(os.environ.get('WATERMARK_FONT_SIZE', '100'))
 WATERMARK_OPACITY = int(os.environ.get('WATERMARK_OPACITY', '128'))  # 0-255
 WATERMARK_POSITION = os.environ.get('WATERMARK_POSITION', 'bottom-right')
+# Optional decode cap: when set, JPEG sources are decoded at 1/2, 1/4 or
+# 1/8 scale by libjpeg's IDCT scaling (draft mode) instead of decoding the
+# full raster and carrying it through the pipeline. 0 keeps original size.
+WATERMARK_MAX_DIMENSION = int(os.environ.get('WATERMARK_MAX_DIMENSION', '0'))
+
+# Position dispatch resolved once at import: each entry maps the image and
+# glyph sizes to the paste origin (the glyph's transparent border supplies
+# the edge margin), replacing the per-invocation if/elif chain
+_POSITIONS = {
+    'top-left': lambda iw, ih, gw, gh: (0, 0),
+    'top-right': lambda iw, ih, gw, gh: (iw - gw, 0),
+    'bottom-left': lambda iw, ih, gw, gh: (0, ih - gh),
+    'center': lambda iw, ih, gw, gh: ((iw - gw) // 2, (ih - gh) // 2),
+    'bottom-right': lambda iw, ih, gw, gh: (iw - gw, ih - gh),
+}
+_POSITION_FN = _POSITIONS.get(WATERMARK_POSITION, _POSITIONS['bottom-right'])
+
+# Encoder dispatch: save options, extension and content type are picked in
+# one lookup when the source format is known instead of re-uppercasing and
+# re-testing original_format at every branch. Unknown formats fall back to
+# JPEG, as before. optimize=True costs an extra Huffman (JPEG) or
+# exhaustive filter-search (PNG) pass for a few percent of size; for a
+# derived output that is the wrong trade, so both encode in a single pass
+# with 4:2:0 chroma subsampling / fast zlib level.
+_JPEG_ENCODER = ({'format': 'JPEG', 'quality': 85, 'subsampling': 2, 'progressive': False}, 'jpg', 'image/jpeg')
+_ENCODERS = {
+    'JPEG': _JPEG_ENCODER,
+    'JPG': _JPEG_ENCODER,
+    'PNG': ({'format': 'PNG', 'compress_level': 1}, 'png', 'image/png'),
+}
+
+
+def _load_font():
+    """Load the watermark font once per container."""
+    try:
+        # Try to use a system font
+        return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", WATERMARK_FONT_SIZE)
+    except:
+        try:
+            # Try another common font path
+            return ImageFont.truetype("/System/Library/Fonts/Arial.ttf", WATERMARK_FONT_SIZE)
+        except:
+            # Fallback to default font
+            logger.warning("Using default font for watermark")
+            return ImageFont.load_default()
+
+# Font and rendered text are invariant across invocations (the text only
+# changes with the date), so load the TTF once at import and memoize the
+# rasterized glyph image instead of re-rendering the outline per image
+_FONT = _load_font()
+_GLYPH_CACHE = {}
+_GLYPH_CACHE_MAX = 4
+
+# Reusable encode buffer: invocations run one at a time per container and
+# the upload future is resolved before the handler returns, so rewinding
+# and truncating one module-level BytesIO replaces a multi-MB allocation
+# (plus its memset) on every warm call
+_OUTPUT_BUFFER = BytesIO()
+
+def _render_watermark(text):
+    """Render (and cache) the watermark text as a small RGBA glyph image."""
+    cache_key = (text, WATERMARK_FONT_SIZE, WATERMARK_OPACITY)
+    glyph = _GLYPH_CACHE.get(cache_key)
+    if glyph is None:
+        bbox = _FONT.getbbox(text)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+        # A 10px transparent border on each side doubles as the edge margin
+        # and keeps antialiased fringes inside the pasted region
+        glyph = Image.new('RGBA', (text_width + 20, text_height + 20), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(glyph)
+        draw.text((10 - bbox[0], 10 - bbox[1]), text, font=_FONT, fill=(255, 255, 255, WATERMARK_OPACITY))
+        if len(_GLYPH_CACHE) >= _GLYPH_CACHE_MAX:
+            # Evict the oldest entry (insertion order); text rotates daily
+            _GLYPH_CACHE.pop(next(iter(_GLYPH_CACHE)))
+        _GLYPH_CACHE[cache_key] = glyph
+    return glyph
+
+# Pre-render today's watermark during the init phase: FreeType parses the
+# TTF tables and rasterizes the glyphs at WATERMARK_FONT_SIZE here, off
+# the first request's critical path, and the warm cache entry is the one
+# every invocation that day will hit
+try:
+    _render_watermark(f"{WATERMARK_TEXT} - {datetime.now(timezone.utc).strftime('%Y-%m-%d')}")
+except Exception:
+    pass
+
 
+def _skip_watermark(image_key, actual_image_id, user_id, original_filename,
+                    original_format, original_size, now_iso):
+    """Pass a too-small image through via server-side copy.
 
+    CopyObject never downloads or re-encodes the bytes, so the whole
+    Pillow pipeline is skipped; the status write runs concurrently as on
+    the normal path. Only called for formats with an _ENCODERS entry, so
+    the key extension matches the normal path's convention (jpeg -> jpg)
+    and the retrieval defaults keep working.
+    """
+    _, file_extension, content_type = _ENCODERS[original_format.upper()]
+
+    base_name = os.path.splitext(original_filename)[0] if original_filename != 'image' else actual_image_id
+    output_key = f"watermarked/{actual_image_id}/{base_name}_watermarked.{file_extension}"
+
+    copy_future = _EXECUTOR.submit(
+        s3_client.copy_object,
+        CopySource={'Bucket': INPUT_BUCKET, 'Key': image_key},
+        Bucket=OUTPUT_BUCKET,
+        Key=output_key,
+        MetadataDirective='REPLACE',
+        ContentType=content_type,
+        ServerSideEncryption='aws:kms',
+        SSEKMSKeyId=KMS_KEY_ID,
+        Metadata={
+            'original-key': image_key,
+            'original-size': f"{original_size[0]}x{original_size[1]}",
+            'watermark-skipped': 'image-too-small',
+            'user-id': user_id,
+            'processed-by': 'lambda-watermark',
+            'processing-date': now_iso
+        }
+    )
+
+    ddb_future = _EXECUTOR.submit(
+        dynamodb_client.update_item,
+        TableName=DYNAMODB_TABLE,
+        Key={'image_id': {'S': actual_image_id}},
+        UpdateExpression='SET processing_status = :status, watermark_result = :result, updated_at = :updated',
+        ExpressionAttributeValues={
+            ':status': {'S': 'watermark_skipped'},
+            ':result': {'M': {
+                'key': {'S': output_key},
+                'format': {'S': file_extension},
+                'skip_reason': {'S': 'image smaller than watermark text'}
+            }},
+            ':updated': {'S': now_iso}
+        },
+        ConditionExpression='attribute_exists(image_id)'
+    )
+
+    copy_future.result()
+    ddb_future.result()
+
+    return {
+        'status': 'success',
+        'message': 'Watermark skipped: image too small for legible text',
+        'watermarked_image': {
+            'key': output_key,
+            'format': file_extension,
+            'content_type': content_type
+        },
+        'original_size': f"{original_size[0]}x{original_size[1]}",
+        'original_format': original_format,
+        'image_id': actual_image_id,
+        'user_id': user_id
+    }
 
 def main(event, context):
     """Lambda handler for actual image watermarking."""
-    print(f"=== WATERMARK STARTED (Real Image Processing) ===")
-    print(f"Event: {json.dumps(event)}")
-    
+    logger.debug("Watermark started: RequestId=%s", context.aws_request_id)
+
     try:
         # Extract input from Step Functions event
         if 'input' in event:
@@ -53,136 +232,133 @@ def main(event, context):
         else:
             actual_image_id = user_id  # Fallback to user_id
         
-        print(f"Processing image: {image_key}")
-        print(f"Actual Image ID: {actual_image_id}")
-        print(f"User ID: {user_id}")
-        print(f"Bucket: {bucket_name}")
-        print(f"Original filename: {original_filename}")
-        
-        # Validate required fields
+        logger.debug("Processing image %s (image_id=%s, user=%s)",
+                     image_key, actual_image_id, user_id)
+
+        # Validate required fields. ValueError marks an input problem:
+        # processing never started, so the except block below skips the
+        # status write for these instead of spending a DynamoDB round trip
+        # on an item that may not exist
         if not image_key:
-            raise Exception("image_key is required but not provided")
+            raise ValueError("image_key is required but not provided")
         if not bucket_name:
-            raise Exception("bucket_name is required but not provided")
+            raise ValueError("bucket_name is required but not provided")
         
-        # Download original image from S3
-        print(f"Downloading image from S3...")
+        # Download original image from S3, handing the HTTP body straight
+        # to Pillow. It buffers the unseekable stream internally, owns the
+        # buffer exclusively, and releases it right after load(), so the
+        # compressed bytes don't stay pinned for the rest of the handler
+        # the way the old read()-into-BytesIO copy did.
         response = s3_client.get_object(Bucket=INPUT_BUCKET, Key=image_key)
-        image_data = response['Body'].read()
-        
-        # Open image with Pillow
-        image = Image.open(BytesIO(image_data))
+        # open() parses only the header, so format and size are available
+        # (and corrupt or unsupported files fail) before any pixels are
+        # decoded; the encoder choice follows from the header alone
+        image = Image.open(response['Body'])
         original_format = image.format or 'JPEG'
         original_size = image.size
-        
-        print(f"Original image size: {original_size}")
-        print(f"Original format: {original_format}")
-        
-        # Convert to RGBA if necessary for watermarking
-        if image.mode != 'RGBA':
+        save_opts, file_extension, content_type = _ENCODERS.get(original_format.upper(), _JPEG_ENCODER)
+
+        # One timestamp per invocation, reused for the watermark date, the
+        # S3 metadata and the DynamoDB update
+        now_iso = datetime.now(timezone.utc).isoformat()
+
+        # Too small for legible text at WATERMARK_FONT_SIZE: skip the whole
+        # decode/draw/encode and copy the original through server-side (the
+        # header is enough to know; the body is never decoded). Only for
+        # formats the normal path passes through unchanged — anything it
+        # would transcode (e.g. GIF to JPEG) still takes the full path so
+        # the stored bytes always match the key's extension.
+        if min(original_size) < WATERMARK_FONT_SIZE * 3 and original_format.upper() in _ENCODERS:
+            logger.debug("Skipping watermark for %s: %s below text size", image_key, original_size)
+            return _skip_watermark(image_key, actual_image_id, user_id,
+                                   original_filename, original_format,
+                                   original_size, now_iso)
+
+        # When a decode cap is configured, let the JPEG decoder scale down
+        # during decode; draft must run before load() and is a no-op for
+        # other formats. original_size above still reports the true size.
+        if WATERMARK_MAX_DIMENSION:
+            image.draft('RGB', (WATERMARK_MAX_DIMENSION, WATERMARK_MAX_DIMENSION))
+        image.load()
+
+        logger.debug("Original image: size=%s format=%s", original_size, original_format)
+
+        # The glyph's alpha channel is applied as the paste mask, so the
+        # image itself never needs an alpha channel: JPEG sources stay in
+        # RGB, skipping the RGBA round trip and the white-background
+        # flatten before encode. Only palette sources (which will be
+        # re-encoded as JPEG below) get expanded, onto white if they
+        # carry transparency.
+        if image.mode == 'P':
             image = image.convert('RGBA')
-        
-        # Create watermark text
-        watermark_text = f"{WATERMARK_TEXT} - {datetime.utcnow().strftime('%Y-%m-%d')}"
-        print(f"Watermark text: {watermark_text}")
-        
-        # Create a new image for the watermark
-        watermark_layer = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(watermark_layer)
-        
-        # Try to use a default font, fallback to basic if not available
-        try:
-            # Try to use a system font
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", WATERMARK_FONT_SIZE)
-        except:
-            try:
-                # Try another common font path
-                font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", WATERMARK_FONT_SIZE)
-            except:
-                # Fallback to default font
-                font = ImageFont.load_default()
-                print("Using default font for watermark")
-        
-        # Get text size
-        bbox = draw.textbbox((0, 0), watermark_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Calculate position based on WATERMARK_POSITION
-        if WATERMARK_POSITION == 'top-left':
-            position = (10, 10)
-        elif WATERMARK_POSITION == 'top-right':
-            position = (image.width - text_width - 10, 10)
-        elif WATERMARK_POSITION == 'bottom-left':
-            position = (10, image.height - text_height - 10)
-        elif WATERMARK_POSITION == 'center':
-            position = ((image.width - text_width) // 2, (image.height - text_height) // 2)
-        else:  # bottom-right (default)
-            position = (image.width - text_width - 10, image.height - text_height - 10)
-        
-        print(f"Watermark position: {position}")
-        
-        # Draw watermark text with semi-transparency
-        draw.text(position, watermark_text, font=font, fill=(255, 255, 255, WATERMARK_OPACITY))
-        
-        # Composite the watermark onto the original image
-        watermarked_image = Image.alpha_composite(image, watermark_layer)
-        
-        # Convert back to RGB if original was not RGBA
-        if original_format.upper() in ['JPEG', 'JPG']:
-            # Create white background for JPEG
-            background = Image.new('RGB', watermarked_image.size, (255, 255, 255))
-            background.paste(watermarked_image, mask=watermarked_image.split()[-1] if watermarked_image.mode == 'RGBA' else None)
-            watermarked_image = background
-        
-        # Save to bytes
-        output_buffer = BytesIO()
-        
-        if original_format.upper() in ['JPEG', 'JPG']:
-            watermarked_image.save(output_buffer, format='JPEG', quality=85, optimize=True)
-            file_extension = 'jpg'
-            content_type = 'image/jpeg'
-        elif original_format.upper() == 'PNG':
-            watermarked_image.save(output_buffer, format='PNG', optimize=True)
-            file_extension = 'png'
-            content_type = 'image/png'
-        else:
-            # Default to JPEG
-            watermarked_image.save(output_buffer, format='JPEG', quality=85, optimize=True)
-            file_extension = 'jpg'
-            content_type = 'image/jpeg'
-        
+        if image.mode in ('RGBA', 'LA') and file_extension != 'png':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            # getchannel extracts just the alpha band; split() would
+            # allocate every channel to use one
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+
+        # Create watermark text; the ISO timestamp starts with YYYY-MM-DD
+        watermark_text = f"{WATERMARK_TEXT} - {now_iso[:10]}"
+
+        # Fetch the pre-rendered watermark glyph (cached across warm
+        # invocations; only the position depends on this image)
+        glyph = _render_watermark(watermark_text)
+        glyph_width, glyph_height = glyph.size
+
+        position = _POSITION_FN(image.width, image.height, glyph_width, glyph_height)
+
+        # Paste the glyph using its own alpha as mask instead of building a
+        # full-canvas watermark layer and alpha-compositing every pixel
+        image.paste(glyph, position, glyph)
+        watermarked_image = image
+
+        # Save to bytes with the encoder chosen up front, reusing the
+        # container's encode buffer
+        output_buffer = _OUTPUT_BUFFER
         output_buffer.seek(0)
-        watermarked_data = output_buffer.getvalue()
-        
+        output_buffer.truncate()
+        watermarked_image.save(output_buffer, **save_opts)
+
+        # Rewind for upload; the transfer manager reads the buffer itself,
+        # so no getvalue() copy of the encoded bytes is made
+        output_buffer.seek(0)
+
         # Create output key
         base_name = os.path.splitext(original_filename)[0] if original_filename != 'image' else actual_image_id
         output_key = f"watermarked/{actual_image_id}/{base_name}_watermarked.{file_extension}"
         
-        # Upload watermarked image to S3
-        print(f"Uploading watermarked image: {output_key}")
-        s3_client.put_object(
-            Bucket=OUTPUT_BUCKET,
-            Key=output_key,
-            Body=watermarked_data,
-            ContentType=content_type,
-            ServerSideEncryption='aws:kms',
-            SSEKMSKeyId=KMS_KEY_ID,
-            Metadata={
-                'original-key': image_key,
-                'original-size': f"{original_size[0]}x{original_size[1]}",
-                'watermark-text': watermark_text,
-                'watermark-position': WATERMARK_POSITION,
-                'watermark-opacity': str(WATERMARK_OPACITY),
-                'user-id': user_id,
-                'processed-by': 'lambda-watermark',
-                'processing-date': datetime.utcnow().isoformat()
-            }
+        # Upload to S3 and record the result in DynamoDB concurrently: the
+        # two writes are independent and both network-bound, so the slower
+        # one hides the other. Both results are resolved below so either
+        # failure still fails the invocation.
+        logger.debug("Uploading watermarked image: %s", output_key)
+        put_future = _EXECUTOR.submit(
+            s3_client.upload_fileobj,
+            output_buffer,
+            OUTPUT_BUCKET,
+            output_key,
+            ExtraArgs={
+                'ContentType': content_type,
+                'ServerSideEncryption': 'aws:kms',
+                'SSEKMSKeyId': KMS_KEY_ID,
+                'Metadata': {
+                    'original-key': image_key,
+                    'original-size': f"{original_size[0]}x{original_size[1]}",
+                    'watermark-text': watermark_text,
+                    'watermark-position': WATERMARK_POSITION,
+                    'watermark-opacity': str(WATERMARK_OPACITY),
+                    'user-id': user_id,
+                    'processed-by': 'lambda-watermark',
+                    'processing-date': now_iso
+                }
+            },
+            Config=_TRANSFER_CONFIG
         )
         
         # Update DynamoDB with processing results
-        print(f"Updating DynamoDB...")
-        dynamodb_client.update_item(
+        ddb_future = _EXECUTOR.submit(
+            dynamodb_client.update_item,
             TableName=DYNAMODB_TABLE,
             Key={'image_id': {'S': actual_image_id}},
             UpdateExpression='SET processing_status = :status, watermark_result = :result, updated_at = :updated',
@@ -194,12 +370,16 @@ def main(event, context):
                     'position': {'S': WATERMARK_POSITION},
                     'format': {'S': file_extension}
                 }},
-                ':updated': {'S': datetime.utcnow().isoformat()}
-            }
+                ':updated': {'S': now_iso}
+            },
+            # The orchestrator creates the item before the workflow starts;
+            # the condition keeps a stray execution from minting orphan rows
+            ConditionExpression='attribute_exists(image_id)'
         )
-        
 
-        
+        put_future.result()
+        ddb_future.result()
+
         result = {
             'status': 'success',
             'message': 'Successfully watermarked image',
@@ -216,19 +396,18 @@ def main(event, context):
             'user_id': user_id
         }
         
-        print(f"=== WATERMARK COMPLETED SUCCESSFULLY ===")
-        print(f"Result: {json.dumps(result)}")
-        
+        logger.debug("Watermark completed for %s: %s", actual_image_id, output_key)
+
         return result
         
     except Exception as e:
         error_msg = f"Error in watermark function: {str(e)}"
-        print(f"=== WATERMARK FAILED ===")
-        print(error_msg)
-        
-        # Update DynamoDB with error status
+        logger.exception(error_msg)
+
+        # Update DynamoDB with error status; input errors short-circuit
+        # because no processing state exists to record
         try:
-            if 'actual_image_id' in locals():
+            if 'actual_image_id' in locals() and not isinstance(e, ValueError):
                 dynamodb_client.update_item(
                     TableName=DYNAMODB_TABLE,
                     Key={'image_id': {'S': actual_image_id}},
@@ -236,10 +415,11 @@ def main(event, context):
                     ExpressionAttributeValues={
                         ':status': {'S': 'watermark_failed'},
                         ':error': {'S': error_msg},
-                        ':updated': {'S': datetime.utcnow().isoformat()}
-                    }
+                        ':updated': {'S': datetime.now(timezone.utc).isoformat()}
+                    },
+                    ConditionExpression='attribute_exists(image_id)'
                 )
         except Exception as db_error:
-            print(f"Failed to update DynamoDB: {str(db_error)}")
+            logger.error("Failed to update DynamoDB: %s", db_error)
         
         raise Exception(error_msg) 
\ No newline at end of file
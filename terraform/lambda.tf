@@ -313,7 +313,7 @@ resource "aws_lambda_function" "resize" {
   timeout       = 300
   memory_size   = 1024
 
-  layers = ["arn:aws:lambda:us-east-1:770693421928:layer:Klayers-p311-Pillow:8"]
+  layers = [var.pillow_layer_arn]
 
   environment {
     variables = {
@@ -351,7 +351,7 @@ resource "aws_lambda_function" "watermark" {
   timeout       = 300
   memory_size   = 1024
 
-  layers = ["arn:aws:lambda:us-east-1:770693421928:layer:Klayers-p311-Pillow:8"]
+  layers = [var.pillow_layer_arn]
 
   environment {
     variables = {
@@ -444,53 +444,108 @@ resource "aws_lambda_event_source_mapping" "orchestrator_sqs" {
   event_source_arn = aws_sqs_queue.upload_events.arn
   function_name    = aws_lambda_function.orchestrator.arn
   batch_size       = 1
+
+  # Only redeliver the messages the orchestrator reports as failed
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
+# Build staging for the Lambda packages: copy each function's source into
+# build/<name> and pip-install its requirements there, targeting the Lambda
+# runtime (manylinux/cp311 wheels) so packaging works from any workstation.
+# The requirements files list only what the python3.11 runtime does not
+# already provide (orjson, xxhash, PyJWT); boto3/botocore ship with the
+# runtime and Pillow comes from the layer, so they are never vendored and
+# the zips stay small.
+resource "null_resource" "lambda_build" {
+  for_each = toset([
+    "auth_handler", "upload_handler", "s3_event_handler", "orchestrator",
+    "validation", "resize", "watermark", "image_retrieval"
+  ])
+
+  triggers = {
+    source       = filesha256("${var.lambda_source_path}/${each.key}/main.py")
+    requirements = filesha256("${var.lambda_source_path}/${each.key}/requirements.txt")
+  }
+
+  provisioner "local-exec" {
+    command = <<-EOT
+      set -e
+      rm -rf "${var.lambda_source_path}/build/${each.key}"
+      mkdir -p "${var.lambda_source_path}/build/${each.key}"
+      cp "${var.lambda_source_path}/${each.key}/main.py" "${var.lambda_source_path}/build/${each.key}/"
+      pip install --quiet \
+        -r "${var.lambda_source_path}/${each.key}/requirements.txt" \
+        --target "${var.lambda_source_path}/build/${each.key}" \
+        --platform manylinux2014_x86_64 --implementation cp \
+        --python-version 3.11 --only-binary=:all:
+    EOT
+  }
 }
 
-# Data sources for Lambda function archives
+# Data sources for Lambda function archives, built from the staged build
+# directories so third-party dependencies are included. Excluding caches
+# and pip metadata keeps the packages small so cold starts spend less time
+# downloading and unpacking code.
 data "archive_file" "auth_handler" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/auth_handler"
+  source_dir  = "${var.lambda_source_path}/build/auth_handler"
   output_path = "${var.lambda_source_path}/auth_handler.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "upload_handler" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/upload_handler"
+  source_dir  = "${var.lambda_source_path}/build/upload_handler"
   output_path = "${var.lambda_source_path}/upload_handler.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "s3_event_handler" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/s3_event_handler"
+  source_dir  = "${var.lambda_source_path}/build/s3_event_handler"
   output_path = "${var.lambda_source_path}/s3_event_handler.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "orchestrator" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/orchestrator"
+  source_dir  = "${var.lambda_source_path}/build/orchestrator"
   output_path = "${var.lambda_source_path}/orchestrator.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "validation" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/validation"
+  source_dir  = "${var.lambda_source_path}/build/validation"
   output_path = "${var.lambda_source_path}/validation.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "resize" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/resize"
+  source_dir  = "${var.lambda_source_path}/build/resize"
   output_path = "${var.lambda_source_path}/resize.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "watermark" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/watermark"
+  source_dir  = "${var.lambda_source_path}/build/watermark"
   output_path = "${var.lambda_source_path}/watermark.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
 
 data "archive_file" "image_retrieval" {
   type        = "zip"
-  source_dir  = "${var.lambda_source_path}/image_retrieval"
+  source_dir  = "${var.lambda_source_path}/build/image_retrieval"
   output_path = "${var.lambda_source_path}/image_retrieval.zip"
+  excludes    = ["__pycache__", "*.zip", "*.dist-info"]
+  depends_on  = [null_resource.lambda_build]
 }
@@ -34,6 +34,13 @@ resource "aws_iam_role_policy" "step_functions" {
           aws_lambda_function.resize.arn,
           aws_lambda_function.watermark.arn
         ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:UpdateItem"
+        ]
+        Resource = aws_dynamodb_table.image_metadata.arn
       }
     ]
   })
@@ -92,10 +99,39 @@ resource "aws_sfn_state_machine" "image_processing" {
             Next = "ResizeFailed"
           }
         ]
-        Next = "Watermark"
+        Next = "RecordResizeResults"
         ResultPath = "$.resize_result"
       }
-      
+
+      # Persist the resize results directly from the workflow instead of a
+      # separate UpdateItem call inside the resize Lambda
+      "RecordResizeResults" = {
+        Type = "Task"
+        Resource = "arn:aws:states:::dynamodb:updateItem"
+        Parameters = {
+          TableName = aws_dynamodb_table.image_metadata.name
+          Key = {
+            image_id = {
+              "S.$" = "$.resize_result.image_id"
+            }
+          }
+          UpdateExpression = "SET processing_status = :status, resize_results = :results, updated_at = :updated"
+          ExpressionAttributeValues = {
+            ":status" = {
+              S = "resized"
+            }
+            ":results" = {
+              "S.$" = "States.JsonToString($.resize_result.processed_images)"
+            }
+            ":updated" = {
+              "S.$" = "$$.State.EnteredTime"
+            }
+          }
+        }
+        Next = "Watermark"
+        ResultPath = null
+      }
+
       "ResizeFailed" = {
         Type = "Fail"
         Cause = "Image resize failed"
@@ -46,4 +46,10 @@ variable "lambda_source_path" {
   default     = "../src/lambda"
 }
 
+variable "pillow_layer_arn" {
+  description = "ARN of the Pillow Lambda layer shared by the resize and watermark functions. Point this at a pillow-simd build (compiled against libjpeg-turbo with AVX2) for a 4-6x speedup of resize, alpha compositing and JPEG encode; the API is identical so no code changes are needed."
+  type        = string
+  default     = "arn:aws:lambda:us-east-1:770693421928:layer:Klayers-p311-Pillow:8"
+}
+
 